@@ -0,0 +1,77 @@
+"""Index builder process for multi-worker deployments.
+
+Owns every write to CHROMA_DIR: builds the first index version (or brings
+the active one up to date), then runs the reload jobs that the serving
+workers (INDEX_ROLE=reader) queue, publishing each new version through the
+CURRENT file. Run exactly one next to the workers, under a supervisor that
+restarts it (start.sh does):
+
+    python -m app.index_builder
+    python -m app.index_builder --once   # build or update, then exit
+
+While running it touches a heartbeat file in CHROMA_DIR/jobs; workers report
+their reload jobs as stale when it stops.
+"""
+import argparse
+import logging
+import signal
+import threading
+import time
+
+from app.services.llm_service import INDEX_POLL_SECONDS, LLMService
+
+logger = logging.getLogger(__name__)
+
+
+def start_heartbeat(service: LLMService, stop: threading.Event) -> threading.Thread:
+    """Touch the heartbeat file every INDEX_POLL_SECONDS, also during long builds"""
+    def beat():
+        while not stop.is_set():
+            try:
+                service.job_store.beat()
+            except OSError as e:
+                logger.warning(f"Could not write the builder heartbeat: {e}")
+            stop.wait(INDEX_POLL_SECONDS)
+
+    thread = threading.Thread(target=beat, name="builder-heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+def handle_sigterm(signum, frame):
+    # Leave through the same path as Ctrl-C, so the service is closed
+    raise KeyboardInterrupt
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Build or update the index once and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    service = LLMService(role="builder")
+    stop = threading.Event()
+    try:
+        if not args.once:
+            start_heartbeat(service, stop)
+            interrupted = service.job_store.fail_interrupted("The index builder exited while the job was running")
+            if interrupted:
+                logger.warning(f"Marked reload jobs interrupted by a builder restart as failed: {', '.join(interrupted)}")
+        service.warm_up()
+        logger.info(f"Index version {service.index.version} is active")
+        if args.once:
+            return 0
+        while True:
+            service.adopt_queued_jobs()
+            time.sleep(INDEX_POLL_SECONDS)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop.set()
+        service.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,19 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
+from contextlib import AsyncExitStack, asynccontextmanager
+import asyncio
+import json
+import logging
 import uvicorn
 from dotenv import load_dotenv
 import os
 import signal
 import sys
-from app.services.llm_service import get_llm_response, LLMService
+from app.routers import image_generator
+from app.services.llm_service import LLMService, BATCH_MAX_QUESTIONS
+from app.services.concurrency import ServiceBusyError
+from app.services.streaming import sse_token_stream, single_token
+from app.services.metrics import REGISTRY, CONTENT_TYPE
+from app.services.session_store import ChatSession
+from app.services.tracing import RequestTrace, activate_trace
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
-app = FastAPI(title="Resume Chatbot API")
-llm_service = LLMService()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the single LLMService for this process and warm it up in the background.
+
+    The server starts accepting requests immediately; /api/ready reports when
+    the index is open and chat requests can be served. Read-only workers
+    (INDEX_ROLE=reader) then keep following the versions the builder publishes.
+    """
+    service = LLMService()
+    app.state.llm_service = service
+
+    async def start():
+        await asyncio.to_thread(service.warm_up)
+        if service.read_only:
+            await service.watch_index()
+
+    startup = asyncio.create_task(start())
+    # warm_up logs its own failure; retrieving the exception keeps asyncio quiet
+    startup.add_done_callback(lambda task: task.cancelled() or task.exception())
+    backgrounds = None
+    if image_generator.IMAGE_PREGENERATE:
+        backgrounds = asyncio.create_task(image_generator.pregenerate_backgrounds())
+    yield
+    startup.cancel()
+    if backgrounds is not None:
+        backgrounds.cancel()
+    service.close()
+
+
+app = FastAPI(title="Resume Chatbot API", lifespan=lifespan)
 
 # Get the frontend URL from environment variable or use default
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -27,6 +68,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(image_generator.router)
+
 class Message(BaseModel):
     role: str  # 'user' or 'assistant'
     content: str
@@ -37,33 +80,291 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None
+    question: str
+
+class BatchRequest(BaseModel):
+    questions: List[Union[str, BatchQuestion]]
+    use_cache: bool = True
+
+class SessionCreateRequest(BaseModel):
+    messages: List[Dict[str, str]] = []  # Optional history to start from
+
+class SessionMessageRequest(BaseModel):
+    content: str = Field(min_length=1)
+
+class SessionChatResponse(BaseModel):
+    session_id: str
+    response: str
+
+def get_llm_service(request: Request) -> LLMService:
+    """Dependency returning the warmed-up LLMService, or 503 while it is starting"""
+    service: LLMService = request.app.state.llm_service
+    if not service.ready:
+        detail = service.startup_error or "Service is starting up"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    return service
+
 @app.get("/")
 async def root():
     return {"message": "Resume Chatbot API is running"}
 
+@app.get("/api/ready")
+async def ready(request: Request):
+    """Readiness probe: 200 once the index is open, 503 before that"""
+    service: LLMService = request.app.state.llm_service
+    if not service.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "status": service.status, "error": service.startup_error}
+        )
+    return {"ready": True, "corpus_version": service.corpus_version}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, token counts and cache hit rates"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     try:
-        response = await llm_service.generate_response(request.messages)
-        return ChatResponse(response=response)
+        answer = await llm_service.answer(request.messages)
+        response.headers["X-Cache"] = "HIT" if answer.cache_hit else "MISS"
+        return ChatResponse(response=answer.content)
+    except ServiceBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        logger.exception("Error in chat endpoint")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/reload-documents")
-async def reload_documents():
-    try:
-        llm_service.reload_documents()
-        return {"message": "Documents reloaded successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/api/reload-documents", status_code=202)
+async def reload_documents(llm_service: LLMService = Depends(get_llm_service)):
+    """Start a background reindex; chat keeps using the current index until it is swapped"""
+    job = llm_service.start_reindex()
+    status_url = f"/api/reload-documents/{job['job_id']}"
+    return JSONResponse(
+        status_code=202,
+        content={"message": "Document reload started", "status_url": status_url, **job},
+        headers={"Location": status_url}
+    )
+
+@app.get("/api/reload-documents/{job_id}")
+async def reload_status(job_id: str, request: Request):
+    """Progress and result of a reindex job"""
+    job = request.app.state.llm_service.get_reindex_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reload job")
+    return job
 
 
-# For streaming support (to be implemented)
 @app.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest):
-    # Implementation for streaming responses
-    pass
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """Stream the answer token by token as Server-Sent Events"""
+    return await stream_chat(llm_service, request.messages, http_request)
+
+async def stream_chat(
+    llm_service: LLMService,
+    messages: List[Dict[str, str]],
+    http_request: Request,
+    session: Optional[ChatSession] = None,
+    turn: Optional[AsyncExitStack] = None
+) -> StreamingResponse:
+    """SSE response for `messages`; with a session, the turn is saved and `turn` closed when the stream ends"""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    # The trace covers the cache lookup here and, on a miss, the generated stream
+    trace = RequestTrace("stream")
+    with activate_trace(trace):
+        try:
+            cached = await llm_service.find_cached_response(messages, session)
+        except Exception:
+            logger.exception("Error in response cache lookup")
+            cached = None
+    if cached is not None:
+        trace.outcome = "hit"
+        trace.finish()
+        tokens = single_token(cached)
+        cache_header = "HIT"
+    else:
+        # Requests joining an identical in-flight stream don't need an LLM slot
+        key = llm_service.flight_key(messages, session)
+        if llm_service.limiter.saturated and llm_service.inflight_streams.is_leader(key):
+            raise HTTPException(status_code=429, detail="Too many concurrent requests", headers={"Retry-After": "1"})
+        tokens = llm_service.generate_streaming_response(messages, trace, session)
+        cache_header = "MISS"
+
+    if session is not None:
+        tokens = record_streamed_turn(
+            llm_service, session, session.history_key(), messages[-1]["content"], tokens, turn
+        )
+    return StreamingResponse(
+        sse_token_stream(tokens, http_request.is_disconnected),
+        media_type="text/event-stream",
+        headers={**headers, "X-Cache": cache_header}
+    )
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchRequest, llm_service: LLMService = Depends(get_llm_service)):
+    """Answer many independent questions in one request.
+
+    Streams one JSON line per question as it completes, with its sources and
+    stage timings, then a summary line.
+    """
+    items = [BatchQuestion(question=item) if isinstance(item, str) else item for item in request.questions]
+    if not items or len(items) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=422, detail=f"Send between 1 and {BATCH_MAX_QUESTIONS} questions")
+    if any(not item.question.strip() for item in items):
+        raise HTTPException(status_code=422, detail="Questions must not be empty")
+
+    async def records():
+        try:
+            async for record in llm_service.answer_batch(
+                [item.question for item in items],
+                use_cache=request.use_cache
+            ):
+                if record["type"] == "result":
+                    record["id"] = items[record["index"]].id
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            logger.exception("Error in batch endpoint")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(records(), media_type="application/x-ndjson")
+
+def get_session(llm_service: LLMService, session_id: str) -> ChatSession:
+    session = llm_service.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session
+
+@asynccontextmanager
+async def session_turn(llm_service: LLMService, session_id: str) -> AsyncIterator[ChatSession]:
+    """Run one turn of a session, yielding the session as of its start.
+
+    Other turns of the session wait in this process until this one is saved,
+    so each answer is generated against the history it is appended to.
+    """
+    async with llm_service.sessions.turn_lock(session_id):
+        yield get_session(llm_service, session_id)
+
+async def record_turn(
+    llm_service: LLMService,
+    session: ChatSession,
+    history_key: str,
+    question: str,
+    answer: str
+):
+    """Add a completed question and answer to the session.
+
+    `history_key` is the session's history_key() when the turn started. If
+    another worker sharing SESSION_DIR added a turn meanwhile, this answer
+    didn't see it and is not saved (409).
+    """
+    current = await asyncio.to_thread(llm_service.sessions.get, session.id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    if current.history_key() != history_key:
+        raise HTTPException(
+            status_code=409,
+            detail="The session changed while this message was answered; send it again"
+        )
+    current.append(
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer},
+        max_messages=llm_service.sessions.max_messages
+    )
+    await asyncio.to_thread(llm_service.sessions.save, current)
+
+async def record_streamed_turn(
+    llm_service: LLMService,
+    session: ChatSession,
+    history_key: str,
+    question: str,
+    tokens: AsyncIterator[str],
+    turn: Optional[AsyncExitStack] = None
+) -> AsyncIterator[str]:
+    # Only a stream that ran to completion becomes part of the conversation
+    try:
+        parts = []
+        async for token in tokens:
+            parts.append(token)
+            yield token
+        await record_turn(llm_service, session, history_key, question, "".join(parts))
+    finally:
+        if turn is not None:
+            await turn.aclose()
+
+@app.post("/api/sessions", status_code=201)
+async def create_session(http_request: Request, request: Optional[SessionCreateRequest] = None):
+    """Start a server-side conversation; later turns send only the new message"""
+    try:
+        session = http_request.app.state.llm_service.sessions.create(request.messages if request else None)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return session.to_dict()
+
+@app.get("/api/sessions/{session_id}")
+async def read_session(session_id: str, request: Request):
+    return get_session(request.app.state.llm_service, session_id).to_dict()
+
+@app.delete("/api/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str, request: Request):
+    if not request.app.state.llm_service.sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return Response(status_code=204)
+
+@app.post("/api/sessions/{session_id}/messages", response_model=SessionChatResponse)
+async def session_chat(
+    session_id: str,
+    request: SessionMessageRequest,
+    response: Response,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """Answer the next message of a session and add the turn to it"""
+    async with session_turn(llm_service, session_id) as session:
+        history_key = session.history_key()
+        messages = session.messages + [{"role": "user", "content": request.content}]
+        try:
+            answer = await llm_service.answer(messages, session)
+        except ServiceBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.exception("Error in session chat endpoint")
+            raise HTTPException(status_code=500, detail=str(e))
+        # A failed generation is reported but doesn't become part of the conversation
+        if not answer.error:
+            await record_turn(llm_service, session, history_key, request.content, answer.content)
+    response.headers["X-Cache"] = "HIT" if answer.cache_hit else "MISS"
+    return SessionChatResponse(session_id=session.id, response=answer.content)
+
+@app.post("/api/sessions/{session_id}/messages/stream")
+async def session_chat_stream(
+    session_id: str,
+    request: SessionMessageRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """Stream the answer to the next message of a session as Server-Sent Events"""
+    # The turn lasts until the stream ends, so the stream closes it. Were the
+    # stream never started, asyncio finalizes the turn's generator when it is
+    # garbage collected, which releases the lock too.
+    turn = AsyncExitStack()
+    session = await turn.enter_async_context(session_turn(llm_service, session_id))
+    try:
+        messages = session.messages + [{"role": "user", "content": request.content}]
+        return await stream_chat(llm_service, messages, http_request, session, turn)
+    except BaseException:
+        await turn.aclose()
+        raise
 
 def signal_handler(sig, frame):
     print("\nShutting down gracefully...")
@@ -74,11 +375,15 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    # Run the server with proper shutdown handling
+    # Run the server with proper shutdown handling. Auto-reload is for local
+    # development only; with WEB_CONCURRENCY > 1 run the workers with
+    # INDEX_ROLE=reader next to one `python -m app.index_builder` (see start.sh).
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True,
+        port=int(os.getenv("PORT", "8000")),
+        reload=os.getenv("UVICORN_RELOAD", "false").lower() in ("1", "true", "yes") and workers == 1,
+        workers=workers,
         log_level="info"
     )
\ No newline at end of file
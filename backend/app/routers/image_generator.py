@@ -1,50 +1,122 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import os
-import io
-import base64
+import asyncio
 from typing import Optional
-import requests
 import logging
 
+from app.services.image_cache import CachedImage, ImageCache, decode_data_uri, prompt_key
+from app.services.metrics import REGISTRY, CallbackMetric
+from app.services.single_flight import AsyncSingleFlight
+
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generated backgrounds are stored by content hash in IMAGE_CACHE_DIR and
+# served from /api/backgrounds/<hash>.<ext>. With IMAGE_PREGENERATE the
+# default style is rendered for every theme and mode at startup.
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(APP_DIR, "data", "image_cache"))
+IMAGE_CACHE_MEMORY_ENTRIES = int(os.getenv("IMAGE_CACHE_MEMORY_ENTRIES", "64"))
+# Prompts kept on disk; the least recently used are evicted with their images
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "500"))
+IMAGE_PREGENERATE = os.getenv("IMAGE_PREGENERATE", "true").lower() in ("1", "true", "yes")
+# Image URLs are content-addressed, so their bytes never change
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+THEMES = ("professional", "creative", "technical", "minimal")
+MODES = ("light", "dark")
+DEFAULT_STYLE = "minimalist"
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MEMORY_ENTRIES, IMAGE_CACHE_MAX_ENTRIES)
+# Concurrent requests for the same prompt share one generation
+inflight_images = AsyncSingleFlight()
+
+REGISTRY.register(CallbackMetric("image_cache_hits_total", "Background requests served from the image cache",
+                                 lambda: image_cache.hits, "counter"))
+REGISTRY.register(CallbackMetric("image_cache_misses_total", "Background requests that needed a generation",
+                                 lambda: image_cache.misses, "counter"))
+REGISTRY.register(CallbackMetric("image_cache_evictions_total", "Prompts evicted from the on-disk image cache",
+                                 lambda: image_cache.evictions, "counter"))
+REGISTRY.register(CallbackMetric("coalesced_images_total", "Background requests that shared an in-flight generation",
+                                 lambda: inflight_images.coalesced, "counter"))
+
 # Models for request and response
 class ImageGenerationRequest(BaseModel):
     theme: str = "professional"
     mode: str = "light"  # light or dark
-    style: str = "minimalist"
+    style: str = DEFAULT_STYLE
     colors: Optional[list] = None
 
 class ImageGenerationResponse(BaseModel):
-    image_data: str  # Base64 encoded image
+    image_url: str  # Cacheable URL of the image bytes
+    image_data: Optional[str] = None  # Base64 data URI, only with ?inline=true
     prompt_used: str
 
 # API endpoint for generating images
 @router.post("/api/generate-background", response_model=ImageGenerationResponse)
-async def generate_background(request: ImageGenerationRequest):
+async def generate_background(
+    request: ImageGenerationRequest,
+    response: Response,
+    inline: bool = Query(False, description="Also return the image as a base64 data URI")
+):
     try:
         # Create a prompt based on the request
         prompt = create_image_prompt(
             theme=request.theme,
             mode=request.mode,
-            style=request.style,
-            colors=request.colors
+            style=request.style.strip().lower(),
+            colors=[str(color).strip().lower() for color in request.colors or [] if str(color).strip()]
         )
-        
-        # Call image generation API
-        image_data = await generate_image_with_api(prompt)
-        
+
+        image, cache_hit = await get_background(prompt)
+        response.headers["X-Cache"] = "HIT" if cache_hit else "MISS"
+
         return ImageGenerationResponse(
-            image_data=image_data,
+            image_url=f"/api/backgrounds/{image.name}",
+            image_data=image.to_data_uri() if inline else None,
             prompt_used=prompt
         )
     except Exception as e:
         logger.error(f"Error generating image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate image: {str(e)}")
 
+@router.get("/api/backgrounds/{name}")
+async def get_background_image(name: str, request: Request):
+    """Raw image bytes; clients revalidate with If-None-Match"""
+    # A memory miss reads the file
+    image = await run_in_threadpool(image_cache.get, name)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Unknown background image")
+    headers = {"ETag": image.etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if image.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=image.data, media_type=image.media_type, headers=headers)
+
+async def get_background(prompt: str) -> tuple:
+    """Return (image, cache_hit), generating the image on a miss"""
+    image = await run_in_threadpool(image_cache.lookup, prompt)
+    if image is not None:
+        return image, True
+    image, _ = await inflight_images.do(prompt_key(prompt), lambda: render_background(prompt))
+    return image, False
+
+async def render_background(prompt: str) -> CachedImage:
+    data, media_type = decode_data_uri(await generate_image_with_api(prompt))
+    return await run_in_threadpool(image_cache.store, prompt, data, media_type)
+
+async def pregenerate_backgrounds():
+    """Render the default style for every theme and mode so first requests hit the cache"""
+    prompts = [create_image_prompt(theme, mode, DEFAULT_STYLE) for theme in THEMES for mode in MODES]
+    results = await asyncio.gather(*(get_background(prompt) for prompt in prompts), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    for failure in failures:
+        logger.warning(f"Background pre-generation failed: {failure}")
+    logger.info(f"Pre-generated {len(prompts) - len(failures)} of {len(prompts)} backgrounds")
+
 def create_image_prompt(theme: str, mode: str, style: str, colors: Optional[list] = None) -> str:
     """Create a prompt for image generation based on parameters"""
     
@@ -83,7 +155,8 @@ def create_image_prompt(theme: str, mode: str, style: str, colors: Optional[list
 async def generate_image_with_api(prompt: str) -> str:
     """
     Generate an image using an API (placeholder for actual implementation)
-    Returns base64 encoded image data
+    Returns the image as a base64 data URI. Must not block the event loop;
+    callers go through get_background(), which caches and de-duplicates.
     """
     # This is a placeholder. In a real implementation, you would:
     # 1. Call an AI image generation API (like OpenAI DALL-E, Stability AI, etc.)
@@ -97,11 +170,12 @@ async def generate_image_with_api(prompt: str) -> str:
         # Example API call (commented out - replace with your actual implementation)
         """
         api_key = os.environ.get("IMAGE_API_KEY")
-        response = requests.post(
-            "https://api.example.com/generate",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json={"prompt": prompt, "size": "1024x1024"}
-        )
+        async with httpx.AsyncClient(timeout=60) as client:
+            response = await client.post(
+                "https://api.example.com/generate",
+                headers={"Authorization": f"Bearer {api_key}"},
+                json={"prompt": prompt, "size": "1024x1024"}
+            )
         response.raise_for_status()
         image_data = response.json().get("image")
         """
@@ -0,0 +1,81 @@
+import os
+from typing import Any, Callable, Dict
+
+# Registries of LLM and embedding backend factories, selected by name through
+# the LLM_BACKEND and EMBEDDING_BACKEND environment variables. The "fake"
+# backends are deterministic local stand-ins used by benchmarks and offline runs.
+LLM_BACKENDS: Dict[str, Callable[[], Any]] = {}
+EMBEDDING_BACKENDS: Dict[str, Callable[[], Any]] = {}
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "200"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_EMBEDDING_DIMENSIONS = int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", "256"))
+
+
+def register_llm_backend(name: str):
+    def decorator(factory: Callable[[], Any]):
+        LLM_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def register_embedding_backend(name: str):
+    def decorator(factory: Callable[[], Any]):
+        EMBEDDING_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def create_llm_backend(name: str):
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; available: {', '.join(sorted(LLM_BACKENDS))}")
+    return LLM_BACKENDS[name]()
+
+
+def create_embedding_backend(name: str):
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {name!r}; available: {', '.join(sorted(EMBEDDING_BACKENDS))}"
+        )
+    return EMBEDDING_BACKENDS[name]()
+
+
+@register_llm_backend("openai")
+def openai_llm():
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        temperature=0.7,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+
+@register_llm_backend("fake")
+def fake_llm():
+    from app.services.mock_llm_service import FakeChatModel
+
+    return FakeChatModel(
+        latency_ms=FAKE_LLM_LATENCY_MS,
+        tokens_per_second=FAKE_LLM_TOKENS_PER_SECOND
+    )
+
+
+@register_embedding_backend("openai")
+def openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        model=EMBEDDING_MODEL
+    )
+
+
+@register_embedding_backend("fake")
+def fake_embeddings():
+    from app.services.mock_llm_service import HashingEmbeddings
+
+    return HashingEmbeddings(dimensions=FAKE_EMBEDDING_DIMENSIONS)
@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class ServiceBusyError(Exception):
+    """Raised when a ConcurrencyLimiter's wait queue is full"""
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent work and rejects callers once too many are waiting.
+
+    Up to max_concurrent callers run at once, up to max_waiting more queue for
+    a slot, and anything beyond that fails fast with ServiceBusyError so the
+    API can answer 429 instead of piling up requests. Callers that bound their
+    own concurrency, such as batch jobs, can always wait instead.
+    """
+
+    def __init__(self, max_concurrent: int, max_waiting: int):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @property
+    def saturated(self) -> bool:
+        """True when a new caller would be rejected"""
+        return self._semaphore.locked() and self.waiting >= self.max_waiting
+
+    @asynccontextmanager
+    async def slot(self, always_wait: bool = False):
+        if self.saturated and not always_wait:
+            raise ServiceBusyError(
+                f"Too many concurrent requests ({self.active} running, {self.waiting} queued)"
+            )
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
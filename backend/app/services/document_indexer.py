@@ -0,0 +1,424 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, asdict, field
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+
+# Chroma write/delete calls are batched so one large file doesn't produce one huge request
+WRITE_BATCH_SIZE = 256
+
+# Seconds between ingest progress log lines
+PROGRESS_LOG_INTERVAL = 5.0
+
+
+@dataclass
+class IndexSyncResult:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    chunks_reused: int = 0
+    corpus_version: str = ""
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+@dataclass
+class IngestProgress:
+    files_total: int = 0
+    files_done: int = 0
+    chunks_embedded: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+@dataclass
+class _FileScan:
+    relpath: str
+    file_hash: str
+    chunks: Optional[List[Tuple[str, "Document"]]]
+
+
+@dataclass
+class _PendingFile:
+    """A changed file whose new chunks are still being embedded"""
+    entry: Dict[str, object]
+    stale_ids: Set[str]
+    remaining: int = 0
+
+
+def create_text_splitter():
+    """Text splitter shared by every code path that chunks documents"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=100,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentIndexer:
+    """Keeps a Chroma collection in sync with the .txt files in a directory.
+
+    A manifest of per-file and per-chunk content hashes is stored next to the
+    index, so a sync only embeds chunks that are new and only deletes chunks
+    that disappeared. Chunk ids are derived from the chunk content, which makes
+    re-adding an unchanged chunk a no-op. The manifest also records the
+    embedding model and dimensions; when `embedding_model` differs from the
+    recorded one, the next sync re-embeds everything.
+    """
+
+    def __init__(
+        self,
+        docs_dir: str,
+        index_dir: str,
+        read_workers: int = 4,
+        embed_batch_size: int = 64,
+        embed_max_in_flight: int = 4,
+        checkpoint_every: int = 25,
+        embedding_model: str = "",
+    ):
+        self.docs_dir = docs_dir
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        self.read_workers = read_workers
+        self.embed_batch_size = embed_batch_size
+        self.embed_max_in_flight = embed_max_in_flight
+        self.checkpoint_every = checkpoint_every
+        self.embedding_model = embedding_model
+        self.progress = IngestProgress()
+        self._text_splitter = None
+
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            self._text_splitter = create_text_splitter()
+        return self._text_splitter
+
+    def _empty_manifest(self) -> Dict[str, object]:
+        return {
+            "version": MANIFEST_VERSION,
+            "corpus_version": "",
+            "embedding_model": "",
+            "embedding_dimensions": None,
+            "files": {},
+        }
+
+    def load_manifest(self) -> Dict[str, object]:
+        """Read the manifest, falling back to an empty one if missing or unreadable"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return self._empty_manifest()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable index manifest {self.manifest_path}: {e}")
+            return self._empty_manifest()
+        if manifest.get("version") != MANIFEST_VERSION:
+            return self._empty_manifest()
+        return manifest
+
+    def save_manifest(self, manifest: Dict[str, object]):
+        """Atomically replace the manifest on disk"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def discover_files(self) -> Dict[str, str]:
+        """Map of path relative to docs_dir -> absolute path for every .txt file"""
+        files = {}
+        for root, _, names in os.walk(self.docs_dir):
+            for name in names:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.docs_dir)] = path
+        return files
+
+    def embedding_changed(self, manifest: Optional[Dict[str, object]] = None) -> bool:
+        """True if the index was embedded with another model than `embedding_model`"""
+        manifest = manifest if manifest is not None else self.load_manifest()
+        return manifest.get("embedding_model", "") != self.embedding_model
+
+    def needs_sync(self) -> bool:
+        """True if a file was added, removed or changed since the manifest was
+        written, or the embedding model changed"""
+        manifest = self.load_manifest()
+        if self.embedding_changed(manifest):
+            return True
+        manifest_files = manifest["files"]
+        discovered = self.discover_files()
+        if set(discovered) != set(manifest_files):
+            return True
+        for relpath, path in discovered.items():
+            with open(path, "rb") as f:
+                if hash_bytes(f.read()) != manifest_files[relpath]["hash"]:
+                    return True
+        return False
+
+    def split_file(self, relpath: str, path: str, data: bytes) -> List[Tuple[str, "Document"]]:
+        """Split a file into chunks and pair each chunk with its content-derived id"""
+        from langchain_core.documents import Document
+
+        document = Document(page_content=data.decode("utf-8"), metadata={"source": path})
+        chunks = self.text_splitter.split_documents([document])
+
+        seen: Dict[str, int] = {}
+        result = []
+        for chunk in chunks:
+            # Identical chunks within one file get distinct ids via an occurrence counter
+            occurrence = seen.get(chunk.page_content, 0)
+            seen[chunk.page_content] = occurrence + 1
+            chunk_id = hash_bytes(f"{relpath}\0{occurrence}\0{chunk.page_content}".encode("utf-8"))
+            result.append((chunk_id, chunk))
+        return result
+
+    @staticmethod
+    def compute_corpus_version(
+        files: Dict[str, Dict[str, object]],
+        embedding_model: str = "",
+        embedding_dimensions: Optional[int] = None
+    ) -> str:
+        """Hash of the indexed file contents and the embeddings they were indexed with"""
+        digest = hashlib.sha256()
+        digest.update(f"{embedding_model}\0{embedding_dimensions}\n".encode("utf-8"))
+        for relpath in sorted(files):
+            digest.update(f"{relpath}\0{files[relpath]['hash']}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _reconcile(self, vectorstore, manifest: Dict[str, object]) -> Tuple[Dict[str, Dict[str, object]], Set[str]]:
+        """Check the manifest against the ids actually stored in the collection.
+
+        Returns the manifest entries whose chunks are all present, and the
+        "orphan" ids that no trusted entry references. Orphans are chunks
+        written by an ingest that died before checkpointing their file, or
+        chunks of an index built before the manifest existed. Because chunk
+        ids are content-derived, a resumed ingest reuses matching orphans
+        instead of embedding them again; the rest are deleted.
+        """
+        existing_ids = set(vectorstore.get(include=[])["ids"])
+        files: Dict[str, Dict[str, object]] = {}
+        for relpath, entry in manifest["files"].items():
+            if existing_ids.issuperset(entry["chunks"]):
+                files[relpath] = entry
+            else:
+                logger.warning(f"Index is missing chunks of {relpath}; re-indexing it")
+
+        known_ids = {chunk_id for entry in files.values() for chunk_id in entry["chunks"]}
+        return files, existing_ids - known_ids
+
+    def _read_file(self, relpath: str, path: str, old_hash: Optional[str]) -> _FileScan:
+        """Hash a file and, if it changed, split it. Runs on the reader pool."""
+        with open(path, "rb") as f:
+            data = f.read()
+        file_hash = hash_bytes(data)
+        if file_hash == old_hash:
+            return _FileScan(relpath, file_hash, None)
+        return _FileScan(relpath, file_hash, self.split_file(relpath, path, data))
+
+    def _scan_files(
+        self,
+        discovered: Dict[str, str],
+        files: Dict[str, Dict[str, object]],
+        readers: ThreadPoolExecutor
+    ) -> Iterator[_FileScan]:
+        """Read and split files concurrently, yielding them in order.
+
+        At most two files per reader are in memory ahead of the consumer.
+        """
+        window: Deque[Future] = deque()
+        for relpath, path in sorted(discovered.items()):
+            old_entry = files.get(relpath)
+            window.append(readers.submit(self._read_file, relpath, path, old_entry["hash"] if old_entry else None))
+            if len(window) >= self.read_workers * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    def sync(self, vectorstore, progress_callback: Optional[Callable[[IngestProgress], None]] = None) -> IndexSyncResult:
+        """Bring the vector store up to date with the documents directory.
+
+        Files are read and split on a worker pool, changed chunks are embedded
+        in batches of `embed_batch_size` with up to `embed_max_in_flight`
+        batches in flight, and each batch is written to Chroma as soon as its
+        embeddings arrive. Memory stays bounded by those limits rather than by
+        the corpus size. The manifest is checkpointed as files complete, so an
+        interrupted sync resumes where it stopped.
+        """
+        manifest = self.load_manifest()
+        if self.embedding_changed(manifest):
+            # Vectors from another model can't be reused, even where the content is unchanged
+            if manifest["files"] or vectorstore._collection.count():
+                logger.info(
+                    f"Embedding model changed from {manifest.get('embedding_model') or 'unknown'!r} "
+                    f"to {self.embedding_model!r}; re-embedding every document"
+                )
+                vectorstore.reset_collection()
+            manifest = self._empty_manifest()
+        manifest["embedding_model"] = self.embedding_model
+        files, orphans = self._reconcile(vectorstore, manifest)
+        previous_files = dict(files)
+        result = IndexSyncResult()
+        discovered = self.discover_files()
+        progress = IngestProgress(files_total=len(discovered))
+        self.progress = progress
+
+        embeddings = vectorstore.embeddings
+        # Chroma's LangChain wrapper always embeds itself; the collection
+        # accepts the embeddings computed by the batch workers directly
+        collection = vectorstore._collection
+
+        pending: Dict[str, _PendingFile] = {}
+        batch: List[Tuple[str, str, "Document"]] = []
+        in_flight: Dict[Future, List[Tuple[str, str, "Document"]]] = {}
+        files_since_checkpoint = 0
+        last_report = time.monotonic()
+
+        def report(force: bool = False):
+            nonlocal last_report
+            if progress_callback is not None:
+                progress_callback(progress)
+            if force or time.monotonic() - last_report >= PROGRESS_LOG_INTERVAL:
+                last_report = time.monotonic()
+                logger.info(f"Ingest progress: {progress.to_dict()}")
+
+        def checkpoint():
+            nonlocal files_since_checkpoint
+            files_since_checkpoint = 0
+            manifest["files"] = files
+            manifest["corpus_version"] = self.compute_corpus_version(
+                files, manifest["embedding_model"], manifest["embedding_dimensions"]
+            )
+            self.save_manifest(manifest)
+
+        def finish_file(relpath: str):
+            nonlocal files_since_checkpoint
+            state = pending.pop(relpath)
+            stale = list(state.stale_ids)
+            for start in range(0, len(stale), WRITE_BATCH_SIZE):
+                vectorstore.delete(ids=stale[start:start + WRITE_BATCH_SIZE])
+            result.chunks_deleted += len(stale)
+            files[relpath] = state.entry
+            progress.files_done += 1
+            files_since_checkpoint += 1
+            if files_since_checkpoint >= self.checkpoint_every:
+                checkpoint()
+            report()
+
+        def write(items: List[Tuple[str, str, "Document"]], vectors: List[List[float]]):
+            if vectors:
+                manifest["embedding_dimensions"] = len(vectors[0])
+            collection.upsert(
+                ids=[chunk_id for _, chunk_id, _ in items],
+                embeddings=vectors,
+                documents=[doc.page_content for _, _, doc in items],
+                metadatas=[doc.metadata for _, _, doc in items]
+            )
+            result.chunks_embedded += len(items)
+            progress.chunks_embedded += len(items)
+            for relpath, _, _ in items:
+                state = pending[relpath]
+                state.remaining -= 1
+                if state.remaining == 0:
+                    finish_file(relpath)
+
+        def wait_for_batches(limit: int):
+            """Write completed batches until fewer than `limit` are in flight"""
+            while len(in_flight) >= limit:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(in_flight.pop(future), future.result())
+
+        def submit_batch():
+            nonlocal batch
+            if not batch:
+                return
+            wait_for_batches(self.embed_max_in_flight)
+            texts = [doc.page_content for _, _, doc in batch]
+            in_flight[embedders.submit(embeddings.embed_documents, texts)] = batch
+            batch = []
+
+        with ThreadPoolExecutor(self.read_workers, thread_name_prefix="ingest-read") as readers, \
+                ThreadPoolExecutor(self.embed_max_in_flight, thread_name_prefix="ingest-embed") as embedders:
+            seen = set()
+            for scan in self._scan_files(discovered, files, readers):
+                seen.add(scan.relpath)
+                old_entry = previous_files.get(scan.relpath)
+                if scan.chunks is None:
+                    result.unchanged += 1
+                    progress.files_done += 1
+                    report()
+                    continue
+
+                if old_entry:
+                    result.updated += 1
+                else:
+                    result.added += 1
+
+                chunk_ids = [chunk_id for chunk_id, _ in scan.chunks]
+                old_ids = set(old_entry["chunks"]) if old_entry else set()
+                state = _PendingFile(
+                    entry={"hash": scan.file_hash, "chunks": chunk_ids},
+                    stale_ids=old_ids.difference(chunk_ids)
+                )
+                pending[scan.relpath] = state
+                for chunk_id, doc in scan.chunks:
+                    if chunk_id in old_ids:
+                        continue
+                    if chunk_id in orphans:
+                        # Embedded by an earlier, interrupted sync
+                        orphans.discard(chunk_id)
+                        result.chunks_reused += 1
+                        continue
+                    state.remaining += 1
+                    batch.append((scan.relpath, chunk_id, doc))
+                    if len(batch) >= self.embed_batch_size:
+                        submit_batch()
+                if state.remaining == 0:
+                    finish_file(scan.relpath)
+
+            submit_batch()
+            wait_for_batches(1)
+
+        for relpath in list(files):
+            if relpath not in seen:
+                stale = files.pop(relpath)["chunks"]
+                for start in range(0, len(stale), WRITE_BATCH_SIZE):
+                    vectorstore.delete(ids=stale[start:start + WRITE_BATCH_SIZE])
+                result.chunks_deleted += len(stale)
+                result.removed += 1
+
+        orphan_ids = list(orphans)
+        for start in range(0, len(orphan_ids), WRITE_BATCH_SIZE):
+            vectorstore.delete(ids=orphan_ids[start:start + WRITE_BATCH_SIZE])
+        result.chunks_deleted += len(orphan_ids)
+
+        checkpoint()
+        result.corpus_version = manifest["corpus_version"]
+        report(force=True)
+        return result
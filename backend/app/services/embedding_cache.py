@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys: unicode NFC, collapsed whitespace"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    """Pack a vector as little-endian float32"""
+    packed = array("f", vector)
+    if packed.itemsize != 4:
+        raise RuntimeError("array('f') is not 32-bit on this platform")
+    return packed.tobytes()
+
+
+def decode_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Size-bounded, disk-backed LRU store of embeddings.
+
+    Vectors are stored as raw float32 blobs in SQLite, keyed on a hash of the
+    model name and the normalized text. A hit only rewrites an entry's
+    last-used time once it is more than `touch_interval` seconds old, so the
+    LRU order is approximate but repeated reads don't each cost a write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, touch_interval: float = 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets several worker processes share the cache without blocking readers
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up several keys at once, refreshing the LRU position of stale entries"""
+        if not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        stale: List[str] = []
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = decode_vector(blob)
+                    if now - last_used > self.touch_interval:
+                        stale.append(key)
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in stale]
+                )
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors and evict the least recently used entries over the size bound"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, encode_vector(vector), now) for key, vector in items.items()]
+            )
+            # Other processes write to the same file, so count inside this
+            # write transaction rather than tracking only our own inserts
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if size > self.max_entries:
+                overflow = size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+                size -= overflow
+            self._conn.commit()
+            self._size = size
+
+    def stats(self) -> Dict[str, object]:
+        """Counters of this process; `entries` is the table size as of its last write"""
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings:
+    """Embeddings wrapper that serves repeated texts from an EmbeddingCache.
+
+    Implements the same embed_documents/embed_query interface as the wrapped
+    LangChain embeddings, so it can be handed straight to Chroma. Concurrent
+    calls for a text that is not cached yet share one upstream request.
+    """
+
+    def __init__(self, underlying, cache: EmbeddingCache, model: Optional[str] = None):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.inflight = SingleFlight()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.make_key(self.model, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, in a single upstream call,
+        # unless another thread is already embedding it
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            def embed(owned: List[str]) -> List[List[float]]:
+                vectors = self.underlying.embed_documents([missing[key] for key in owned])
+                self.cache.put_many(dict(zip(owned, vectors)))
+                return vectors
+
+            found.update(zip(missing, self.inflight.do_many(list(missing), embed)))
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+
+        def embed() -> List[float]:
+            vector = self.underlying.embed_query(text)
+            self.cache.put_many({key: vector})
+            return vector
+
+        return self.inflight.do(key, embed)
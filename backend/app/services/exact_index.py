@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "vectors_chunks.json"
+
+# Chunks read from Chroma per request when exporting a collection
+EXPORT_PAGE_SIZE = 1000
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores along the last axis, best first"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class ExactVectorIndex:
+    """Brute-force cosine search over all chunk embeddings.
+
+    Embeddings are held as one contiguous, L2-normalized float32 matrix, so
+    a query is a single matrix-vector product followed by argpartition. For
+    a corpus of a few thousand chunks that is faster than an HNSW lookup
+    through the Chroma client. The matrix can be exported next to an index
+    version and memory-mapped by every worker process.
+
+    Offers the similarity_search methods the service uses on Chroma.
+    """
+
+    def __init__(self, docs: Sequence["Document"], matrix: np.ndarray, embedding_function=None):
+        self.docs = list(docs)
+        self.matrix = matrix
+        self.embedding_function = embedding_function
+
+    @classmethod
+    def from_vectors(cls, docs: Sequence["Document"], vectors, embedding_function=None) -> "ExactVectorIndex":
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(docs), -1)
+        return cls(docs, np.ascontiguousarray(normalize_rows(matrix), dtype=np.float32), embedding_function)
+
+    @classmethod
+    def from_vectorstore(
+        cls,
+        vectorstore,
+        embedding_function=None,
+        page_size: int = EXPORT_PAGE_SIZE
+    ) -> "ExactVectorIndex":
+        """Copy the chunks and embeddings out of a Chroma collection.
+
+        The collection is read `page_size` chunks at a time into a
+        preallocated float32 matrix, so the export never holds more than one
+        page of embeddings as Python objects.
+        """
+        from langchain_core.documents import Document
+
+        count = vectorstore._collection.count()
+        docs: List["Document"] = []
+        matrix: Optional[np.ndarray] = None
+        while len(docs) < count:
+            data = vectorstore.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=page_size,
+                offset=len(docs)
+            )
+            if not data["ids"]:
+                break
+            page = np.asarray(data["embeddings"], dtype=np.float32)
+            if matrix is None:
+                matrix = np.empty((count, page.shape[1]), dtype=np.float32)
+            matrix[len(docs):len(docs) + len(page)] = normalize_rows(page)
+            docs.extend(
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(data["documents"], data["metadatas"])
+            )
+        if matrix is None:
+            return cls(docs, np.zeros((0, 0), dtype=np.float32), embedding_function)
+        return cls(docs, matrix[:len(docs)], embedding_function)
+
+    def save(self, directory: str, corpus_version: str):
+        """Write the matrix and chunks next to an index version"""
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        chunks_path = os.path.join(directory, CHUNKS_FILE)
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, self.matrix)
+        with open(f"{chunks_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "corpus_version": corpus_version,
+                "texts": [doc.page_content for doc in self.docs],
+                "metadatas": [doc.metadata for doc in self.docs],
+            }, f)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{chunks_path}.tmp", chunks_path)
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        corpus_version: str,
+        embedding_function=None,
+        mmap: bool = True
+    ) -> Optional["ExactVectorIndex"]:
+        """Open an exported index, memory-mapped by default.
+
+        Returns None if there is no export for `corpus_version`.
+        """
+        from langchain_core.documents import Document
+
+        try:
+            with open(os.path.join(directory, CHUNKS_FILE), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            if chunks["corpus_version"] != corpus_version:
+                return None
+            matrix = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable vector export in {directory}: {e}")
+            return None
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(chunks["texts"], chunks["metadatas"])
+        ]
+        if len(docs) != matrix.shape[0]:
+            logger.warning(f"Ignoring vector export in {directory}: chunk count does not match")
+            return None
+        return cls(docs, matrix, embedding_function)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _query_matrix(self, vectors) -> np.ndarray:
+        return normalize_rows(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+
+    def search_by_vectors(self, vectors, k: int) -> List[List[Tuple["Document", float]]]:
+        """Top-k (chunk, cosine similarity) pairs for each query vector, in one matrix product"""
+        queries = self._query_matrix(vectors)
+        if not self.docs:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ self.matrix.T
+        indices = top_k_indices(scores, k)
+        return [
+            [(self.docs[idx], float(row_scores[idx])) for idx in row]
+            for row, row_scores in zip(indices, scores)
+        ]
+
+    def similarity_search_by_vectors(self, vectors, k: int = 4) -> List[List["Document"]]:
+        """Batched similarity_search_by_vector"""
+        return [[doc for doc, _ in hits] for hits in self.search_by_vectors(vectors, k)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs: Any) -> List["Document"]:
+        return self.similarity_search_by_vectors([embedding], k)[0]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4) -> List[Tuple["Document", float]]:
+        return self.search_by_vectors([embedding], k)[0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List["Document"]:
+        if self.embedding_function is None:
+            raise ValueError("similarity_search needs an embedding function")
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "chunks": len(self.docs),
+            "dimensions": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+            "memory_mapped": isinstance(self.matrix, np.memmap),
+        }
@@ -0,0 +1,152 @@
+import math
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# Keeps technology names intact: "c++", "c#", "next.js", "node.js"
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+# Question scaffolding that carries no retrieval signal
+STOPWORDS = frozenset("""
+a about an and any are as at be been by can could describe did do does doing done
+for from had has have he her him his how i if in into is it its know knows me
+my of on or our she so tell than that the their them then there these they this
+those to use used uses using was we were what when where which who whom why will
+with work worked works would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct non-stopword terms of a query, in order of appearance"""
+    return list(dict.fromkeys(t for t in tokenize(text) if t not in STOPWORDS))
+
+
+def doc_key(doc: "Document") -> Tuple[str, str]:
+    """Identity of a chunk across retrievers"""
+    return doc.metadata.get("source", ""), doc.page_content
+
+
+class BM25Index:
+    """In-process inverted index over the same chunks stored in Chroma"""
+
+    def __init__(self, docs: Sequence["Document"], k1: float = 1.5, b: float = 0.75):
+        self.docs = list(docs)
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for idx, doc in enumerate(self.docs):
+            counts = Counter(tokenize(doc.page_content))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((idx, tf))
+
+        n = len(self.docs)
+        self.avg_length = sum(self.doc_lengths) / n if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "BM25Index":
+        """Build the index from the chunk texts already stored in a Chroma collection"""
+        from langchain_core.documents import Document
+
+        data = vectorstore.get(include=["documents", "metadatas"])
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(data["documents"], data["metadatas"])
+        ]
+        return cls(docs)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def is_keyword_query(self, query: str, max_terms: int, max_doc_share: float) -> bool:
+        """True for bare keyword lookups: at most `max_terms` terms, no question
+        words, and every term rare in the corpus (in at most `max_doc_share` of
+        the chunks, and at least one).
+
+        Those are answered from BM25 alone, without embedding the query;
+        anything phrased as a question also gets vector search.
+        """
+        tokens = tokenize(query)
+        if not tokens or len(tokens) > max_terms or any(token in STOPWORDS for token in tokens):
+            return False
+        max_docs = max(1, int(len(self.docs) * max_doc_share))
+        return all(0 < len(self.postings.get(token, ())) <= max_docs for token in tokens)
+
+    def search(self, query: str, k: int) -> List[Tuple["Document", float]]:
+        scores: Dict[int, float] = {}
+        for term in query_terms(query):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for idx, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[idx] / self.avg_length)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.docs[idx], score) for idx, score in ranked]
+
+    def coverage(self, query: str, doc: "Document") -> float:
+        """IDF-weighted share of the query's known terms that appear in the chunk"""
+        terms = [term for term in query_terms(query) if term in self.idf]
+        if not terms:
+            return 0.0
+        doc_terms = set(tokenize(doc.page_content))
+        total = sum(self.idf[term] for term in terms)
+        matched = sum(self.idf[term] for term in terms if term in doc_terms)
+        return matched / total if total else 0.0
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence["Document"]], k: int = 60
+) -> List[Tuple["Document", float]]:
+    """Merge ranked lists by summing 1 / (k + rank) per chunk"""
+    scores: Dict[Tuple[str, str], float] = {}
+    docs: Dict[Tuple[str, str], "Document"] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(docs[key], score) for key, score in ranked]
+
+
+def rerank(
+    query: str,
+    fused: Sequence[Tuple["Document", float]],
+    bm25: BM25Index,
+    cutoff: float,
+    min_docs: int,
+    max_docs: int,
+) -> List["Document"]:
+    """Keep the smallest set of chunks that clears the score cutoff.
+
+    The score averages the fused rank score (relative to the best chunk) with
+    the chunk's lexical coverage of the query, so chunks that rank well in
+    either retriever and actually mention the query terms survive.
+    """
+    if not fused:
+        return []
+    top = fused[0][1]
+    scored = []
+    for doc, fused_score in fused[:max_docs]:
+        score = 0.5 * (fused_score / top) + 0.5 * bm25.coverage(query, doc)
+        scored.append((doc, score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+
+    kept = [doc for doc, score in scored if score >= cutoff]
+    if len(kept) < min_docs:
+        kept = [doc for doc, _ in scored[:min_docs]]
+    return kept
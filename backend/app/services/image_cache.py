@@ -0,0 +1,239 @@
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = "prompts"
+MEDIA_TYPE_EXTENSIONS = {
+    "image/svg+xml": "svg",
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+}
+EXTENSION_MEDIA_TYPES = {ext: media_type for media_type, ext in MEDIA_TYPE_EXTENSIONS.items()}
+IMAGE_NAME = re.compile(r"^([0-9a-f]{64})\.([a-z]+)$")
+# Eviction leaves images without a prompt record alone until they are this old
+ORPHAN_GRACE_SECONDS = 60
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def decode_data_uri(data_uri: str) -> Tuple[bytes, str]:
+    """Split a base64 `data:` URI into its bytes and media type"""
+    header, sep, payload = data_uri.partition(",")
+    if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+        raise ValueError("Expected a base64 data URI")
+    media_type = header[len("data:"):-len(";base64")]
+    if media_type not in MEDIA_TYPE_EXTENSIONS:
+        raise ValueError(f"Unsupported image type {media_type!r}")
+    try:
+        return base64.b64decode(payload, validate=True), media_type
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    digest: str
+    media_type: str
+    data: bytes
+
+    @property
+    def name(self) -> str:
+        return f"{self.digest}.{MEDIA_TYPE_EXTENSIONS[self.media_type]}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+    def to_data_uri(self) -> str:
+        return f"data:{self.media_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def write_bytes_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ImageCache:
+    """Content-addressed, size-bounded store for generated images.
+
+    Each image is written once as `<directory>/<sha256 of its bytes>.<ext>`,
+    so its name never changes meaning and can be cached forever by browsers.
+    `<directory>/prompts/<prompt key>.json` maps a normalized prompt to the
+    image generated for it. Recently used images are kept in memory.
+
+    At most `max_entries` prompts are kept on disk; storing one more deletes
+    the least recently used prompt records and the images no other prompt
+    refers to. A hit only refreshes a record's mtime, which orders eviction,
+    once it is more than `touch_interval` seconds old.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_memory_entries: int = 64,
+        max_entries: int = 500,
+        touch_interval: float = 3600
+    ):
+        self.directory = directory
+        self.prompts_dir = os.path.join(directory, PROMPTS_DIR)
+        self.max_memory_entries = max_memory_entries
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._images: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._prompts: Dict[str, str] = {}
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, image: CachedImage):
+        with self._lock:
+            self._images[image.name] = image
+            self._images.move_to_end(image.name)
+            while len(self._images) > self.max_memory_entries:
+                self._images.popitem(last=False)
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self.prompts_dir, f"{key}.json")
+
+    def get(self, name: str) -> Optional[CachedImage]:
+        """An image by its content-addressed name, or None. Blocking on a memory miss."""
+        match = IMAGE_NAME.match(name)
+        if not match or match.group(2) not in EXTENSION_MEDIA_TYPES:
+            return None
+        with self._lock:
+            image = self._images.get(name)
+            if image is not None:
+                self._images.move_to_end(name)
+                return image
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        image = CachedImage(match.group(1), EXTENSION_MEDIA_TYPES[match.group(2)], data)
+        self._remember(image)
+        return image
+
+    def _touch(self, key: str):
+        now = time.time()
+        if now - self._touched.get(key, 0) <= self.touch_interval:
+            return
+        try:
+            os.utime(self._record_path(key))
+        except FileNotFoundError:
+            return
+        self._touched[key] = now
+
+    def lookup(self, prompt: str) -> Optional[CachedImage]:
+        """The image generated for `prompt`, or None. Blocking; may read from disk."""
+        key = prompt_key(prompt)
+        name = self._prompts.get(key)
+        if name is None:
+            try:
+                with open(self._record_path(key), "r", encoding="utf-8") as f:
+                    name = json.load(f)["image"]
+            except (FileNotFoundError, ValueError, KeyError):
+                name = None
+        image = self.get(name) if name else None
+        if image is None:
+            self._prompts.pop(key, None)
+            self.misses += 1
+            return None
+        self._prompts[key] = name
+        self._touch(key)
+        self.hits += 1
+        return image
+
+    def store(self, prompt: str, data: bytes, media_type: str) -> CachedImage:
+        """Save the image generated for `prompt`. Blocking; writes to disk."""
+        image = CachedImage(hashlib.sha256(data).hexdigest(), media_type, data)
+        os.makedirs(self.prompts_dir, exist_ok=True)
+        path = os.path.join(self.directory, image.name)
+        if not os.path.exists(path):
+            write_bytes_atomic(path, data)
+        key = prompt_key(prompt)
+        record = {"image": image.name, "prompt": normalize_prompt(prompt)}
+        write_bytes_atomic(self._record_path(key), json.dumps(record).encode("utf-8"))
+        self._touched[key] = time.time()
+        self._remember(image)
+        self._prompts[key] = image.name
+        self._evict()
+        return image
+
+    def _evict(self):
+        """Delete the least recently used prompts over the bound and images left without a prompt"""
+        records = []
+        for entry in os.scandir(self.prompts_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                records.append((entry.stat().st_mtime, entry.name[:-len(".json")]))
+            except FileNotFoundError:
+                pass
+        if len(records) <= self.max_entries:
+            return
+        # Other processes share the directory, so the listing is the source of truth
+        records.sort()
+        overflow = len(records) - self.max_entries
+        for _, key in records[:overflow]:
+            try:
+                os.remove(self._record_path(key))
+            except FileNotFoundError:
+                pass
+            self._prompts.pop(key, None)
+            self._touched.pop(key, None)
+        self.evictions += overflow
+
+        referenced = set()
+        for _, key in records[overflow:]:
+            try:
+                with open(self._record_path(key), "r", encoding="utf-8") as f:
+                    referenced.add(json.load(f)["image"])
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if not IMAGE_NAME.match(entry.name) or entry.name in referenced:
+                continue
+            try:
+                # Another process may have written the image but not yet its prompt record
+                if now - entry.stat().st_mtime < ORPHAN_GRACE_SECONDS:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._images.pop(entry.name, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "prompts": len(self._prompts),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
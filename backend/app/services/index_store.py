@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.services.document_indexer import DocumentIndexer, IndexSyncResult
+from app.services.hybrid_retriever import BM25Index
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+JOBS_DIR = "jobs"
+HEARTBEAT_FILE = "builder.heartbeat"
+
+
+@dataclass
+class IndexSnapshot:
+    """Everything a request reads from the index, swapped as one reference.
+
+    Requests take the service's current snapshot once and use it throughout,
+    so a reindex that swaps in a new snapshot never mixes two versions.
+    """
+    version: str
+    path: str
+    chroma: Any
+    bm25: BM25Index
+    corpus_version: str
+    # Dense search backend: an ExactVectorIndex, or `chroma` itself
+    vectors: Any = None
+
+    @property
+    def vector_search(self) -> Any:
+        return self.vectors if self.vectors is not None else self.chroma
+
+
+def close_vectorstore(vectorstore):
+    """Stop the Chroma system of a retired index.
+
+    chromadb keeps one System (SQLite connection, HNSW segments, open files)
+    per persist directory for the life of the process unless it is stopped
+    and dropped from the client's shared cache. Each version directory is
+    opened by one client per process, so stopping its system is safe.
+    """
+    client = getattr(vectorstore, "_client", None)
+    if client is None:
+        return
+    try:
+        close = getattr(client, "close", None)
+        if close is not None:
+            # Newer chromadb releases reference-count systems and stop the last one
+            close()
+            return
+        from chromadb.api.client import SharedSystemClient
+
+        system = SharedSystemClient._identifer_to_system.pop(client._identifier, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        logger.warning(f"Error closing retired index: {e}")
+
+
+def write_atomic(path: str, content: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class IndexVersions:
+    """Versioned Chroma directories under one root.
+
+    Each version lives in `<root>/versions/<version>` together with its
+    manifest; `<root>/CURRENT` names the active one and is replaced atomically.
+    A version is never written to after it has been activated, so any number
+    of processes can read it while a new version is being built.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+        self.current_path = os.path.join(root, CURRENT_FILE)
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and os.path.isdir(self.path(version)) else None
+
+    def list_versions(self) -> List[str]:
+        try:
+            return sorted(os.listdir(self.versions_dir))
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def new_version() -> str:
+        # Sortable by creation time, unique across processes
+        return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def create(self, base: Optional[str] = None) -> str:
+        """Create a new version directory, starting as a copy of `base` if given"""
+        version = self.new_version()
+        path = self.path(version)
+        os.makedirs(self.versions_dir, exist_ok=True)
+        if base is not None:
+            shutil.copytree(self.path(base), path)
+        else:
+            os.makedirs(path)
+        return version
+
+    def activate(self, version: str):
+        previous = self.current()
+        os.makedirs(self.root, exist_ok=True)
+        write_atomic(self.current_path, version)
+        if previous is not None and previous != version:
+            # Start the retired version's garbage-collection grace period now
+            os.utime(self.path(previous))
+
+    def adopt_legacy(self) -> Optional[str]:
+        """Move an index persisted directly in the root by earlier releases into
+        a first version and activate it. Returns None if there is none."""
+        legacy = [
+            name for name in os.listdir(self.root)
+            if name not in (VERSIONS_DIR, JOBS_DIR) and not name.startswith(CURRENT_FILE)
+        ] if os.path.isdir(self.root) else []
+        if not legacy:
+            return None
+        version = self.create()
+        for name in legacy:
+            os.replace(os.path.join(self.root, name), os.path.join(self.path(version), name))
+        self.activate(version)
+        return version
+
+    def remove(self, version: str):
+        shutil.rmtree(self.path(version), ignore_errors=True)
+
+    def collect_garbage(self, keep: Iterable[str], min_age_seconds: float = 0) -> List[str]:
+        """Delete every version not in `keep` that is older than `min_age_seconds`.
+
+        The age guard leaves versions that other processes may still be
+        reading. Returns the removed versions.
+        """
+        keep = set(keep)
+        now = time.time()
+        removed = [
+            version for version in self.list_versions()
+            if version not in keep and now - os.path.getmtime(self.path(version)) >= min_age_seconds
+        ]
+        for version in removed:
+            self.remove(version)
+        if removed:
+            logger.info(f"Removed old index versions: {', '.join(removed)}")
+        return removed
+
+
+@dataclass
+class ReindexJob:
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    state: str = "queued"  # queued, running, succeeded or failed; readers also report "stale"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    version: Optional[str] = None
+    indexer: Optional[DocumentIndexer] = None
+    result: Optional[IndexSyncResult] = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, object]:
+        progress = self.indexer.progress.to_dict() if self.indexer else None
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "version": self.version,
+            "progress": progress,
+            "result": self.result.to_dict() if self.result else None,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """Reindex job status files shared between processes.
+
+    Serving workers that cannot write the index submit jobs here; the builder
+    process picks up queued jobs and records their progress and result. The
+    builder also touches a heartbeat file, so workers can tell when no
+    builder is running to pick their jobs up.
+    """
+
+    def __init__(self, root: str, history: int = 20):
+        self.jobs_dir = os.path.join(root, JOBS_DIR)
+        self.heartbeat_path = os.path.join(self.jobs_dir, HEARTBEAT_FILE)
+        self.history = history
+
+    def path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def beat(self):
+        """Record that the builder is alive"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with open(self.heartbeat_path, "a"):
+            os.utime(self.heartbeat_path)
+
+    def builder_last_seen(self) -> Optional[float]:
+        """Time of the builder's last heartbeat, or None if it never ran"""
+        try:
+            return os.path.getmtime(self.heartbeat_path)
+        except FileNotFoundError:
+            return None
+
+    def save(self, job: ReindexJob):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        write_atomic(self.path(job.id), json.dumps(job.to_dict()))
+
+    def load(self, job_id: str) -> Optional[Dict[str, object]]:
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self.path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def all(self) -> List[Dict[str, object]]:
+        """Every job, oldest first"""
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return []
+        jobs = [self.load(name[:-len(".json")]) for name in names if name.endswith(".json")]
+        return sorted((job for job in jobs if job), key=lambda job: job["created_at"])
+
+    def queued(self) -> List[Dict[str, object]]:
+        return [job for job in self.all() if job["state"] == "queued"]
+
+    def fail_interrupted(self, error: str) -> List[str]:
+        """Mark jobs left running by a builder that exited as failed. Returns their ids."""
+        failed = []
+        for job in self.all():
+            if job["state"] == "running":
+                job.update(state="failed", error=error, finished_at=time.time())
+                write_atomic(self.path(job["job_id"]), json.dumps(job))
+                failed.append(job["job_id"])
+        return failed
+
+    def prune(self):
+        """Keep the newest `history` finished jobs"""
+        finished = [job for job in self.all() if job["state"] in ("succeeded", "failed")]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            try:
+                os.remove(self.path(job["job_id"]))
+            except FileNotFoundError:
+                pass
@@ -1,154 +1,141 @@
+import asyncio
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dotenv import load_dotenv
-from typing import List, Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-import shutil
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from app.services.document_indexer import DocumentIndexer, IndexSyncResult
+from app.services.exact_index import ExactVectorIndex
+from app.services.index_store import IndexSnapshot, IndexVersions, JobStore, ReindexJob, close_vectorstore
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache, normalize_text
+from app.services.concurrency import ConcurrencyLimiter, ServiceBusyError
+from app.services.response_cache import SemanticResponseCache, conversation_key
+from app.services.session_store import ChatSession, SessionStore
+from app.services.hybrid_retriever import BM25Index, reciprocal_rank_fusion, rerank
+from app.services.prompt_builder import PromptBuilder, count_tokens, load_encoding
+from app.services.backends import create_llm_backend, create_embedding_backend
+from app.services.metrics import REGISTRY, CallbackMetric, COMPLETION_TOKENS, PROMPT_TOKENS
+from app.services.tracing import (
+    RequestTrace, activate_trace, annotate, record_stage, request_trace, span
+)
+from app.services.single_flight import AsyncSingleFlight, AsyncStreamSingleFlight
+
+# LangChain, Chroma and the OpenAI clients are imported inside the functions
+# that need them, so importing the app stays fast and the cost is paid once
+# while the service warms up in the background.
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
-# Debug: Print the API key (first few characters only)
-api_key = os.getenv('OPENAI_API_KEY')
-if api_key:
-    print(f"API Key loaded: {api_key[:8]}...")
-else:
-    print("No API key found in environment variables!")
-
 # Get the absolute path to the app directory
 APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-print(f"App directory: {APP_DIR}")
 
-# Path to documents for RAG
-DOCS_DIR = os.path.join(APP_DIR, "data", "documents")
-CHROMA_DIR = os.path.join(APP_DIR, "data", "chroma")
+# Path to documents for RAG. CHROMA_DIR holds one directory per index
+# version (see app.services.index_store).
+DOCS_DIR = os.getenv("DOCS_DIR", os.path.join(APP_DIR, "data", "documents"))
+CHROMA_DIR = os.getenv("CHROMA_DIR", os.path.join(APP_DIR, "data", "chroma"))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(APP_DIR, "data", "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
 
-print(f"Documents directory: {DOCS_DIR}")
-print(f"Chroma directory: {CHROMA_DIR}")
+# Backends registered in app.services.backends ("openai" or the local "fake")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
 
-# Create necessary directories if they don't exist
-os.makedirs(DOCS_DIR, exist_ok=True)
-os.makedirs(CHROMA_DIR, exist_ok=True)
+# Whether warm-up syncs the persisted index with the documents directory.
+# When disabled the index is opened as-is and only /api/reload-documents
+# picks up document changes.
+INDEX_SYNC_ON_STARTUP = os.getenv("INDEX_SYNC_ON_STARTUP", "true").lower() in ("1", "true", "yes")
 
-# Debug: List files in documents directory
-print("Files in documents directory:")
-for file in os.listdir(DOCS_DIR):
-    print(f"- {file}")
+# Reloads build a new index version in the background and swap it in. The
+# replaced version is deleted after INDEX_GC_GRACE_SECONDS, once requests
+# that were already reading it have finished; REINDEX_JOB_HISTORY finished
+# jobs are kept for the status endpoint.
+INDEX_GC_GRACE_SECONDS = float(os.getenv("INDEX_GC_GRACE_SECONDS", "60"))
+REINDEX_JOB_HISTORY = int(os.getenv("REINDEX_JOB_HISTORY", "20"))
 
-# Initialize embedding model
-embeddings = OpenAIEmbeddings(
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    model="text-embedding-ada-002"
-)
+# "standalone": one process builds, writes and serves the index.
+# "reader": a serving worker in a multi-process deployment. It opens index
+# versions read-only, follows CURRENT every INDEX_POLL_SECONDS and queues
+# reloads for the builder process (python -m app.index_builder).
+INDEX_ROLE = os.getenv("INDEX_ROLE", "standalone")
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "2"))
+INDEX_ROLES = ("standalone", "reader", "builder")
+# Readers report unfinished reload jobs as "stale" when the builder's
+# heartbeat is older than this
+BUILDER_HEARTBEAT_TIMEOUT = float(os.getenv("BUILDER_HEARTBEAT_TIMEOUT", "30"))
 
-class LLMService:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0.7,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        self.embeddings = embeddings  # Use the module-level embeddings instance
-        self.chroma = None
-        self.load_documents()
+# Ingestion pipeline: threads reading and splitting files, chunks per embedding
+# request, embedding requests in flight, and files between manifest checkpoints
+INGEST_READ_WORKERS = int(os.getenv("INGEST_READ_WORKERS", "4"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+INGEST_CHECKPOINT_EVERY = int(os.getenv("INGEST_CHECKPOINT_EVERY", "25"))
 
-    def load_documents(self):
-        """Load and index documents from the documents directory"""
-        try:
-            # Load documents
-            loader = DirectoryLoader(
-                DOCS_DIR,
-                glob="**/*.txt",
-                loader_cls=TextLoader
-            )
-            documents = loader.load()
-            
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=500,
-                chunk_overlap=100,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            chunks = text_splitter.split_documents(documents)
-            
-            # Create or update ChromaDB
-            self.chroma = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                persist_directory=CHROMA_DIR
-            )
-            print(f"Successfully loaded {len(documents)} documents and indexed into {len(chunks)} chunks")
-        except Exception as e:
-            print(f"Error loading documents: {str(e)}")
-            raise
+# Request pipeline limits: concurrent LLM generations, requests allowed to
+# queue behind them before we answer 429, and threads for blocking retrieval
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
 
-    def reload_documents(self):
-        """Reload documents from the documents directory"""
-        try:
-            # Delete existing ChromaDB
-            if os.path.exists(CHROMA_DIR):
-                shutil.rmtree(CHROMA_DIR)
-            
-            # Reload documents
-            self.load_documents()
-            print("Successfully reloaded documents")
-        except Exception as e:
-            print(f"Error reloading documents: {str(e)}")
-            raise
+# Batch question answering (/api/chat/batch): questions per request, and
+# generations a batch runs at once, leaving LLM slots for interactive chat
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
 
-    def format_messages(self, messages: List[Dict[str, str]]) -> List[Any]:
-        """Convert messages from the frontend format to LangChain format."""
-        formatted_messages = []
+# Semantic answer cache: minimum cosine similarity for a hit, size and lifetime.
+# RESPONSE_CACHE_MAX_ENTRIES=0 disables it.
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
 
-        for message in messages:
-            if message["role"] == "system":
-                formatted_messages.append(SystemMessage(content=message["content"]))
-            elif message["role"] == "user":
-                formatted_messages.append(HumanMessage(content=message["content"]))
-            elif message["role"] == "assistant":
-                formatted_messages.append(AIMessage(content=message["content"]))
+# Hybrid retrieval: candidates taken from each retriever, the most chunks sent
+# to the LLM, and the reranker that trims them. Bare keyword lookups (up to
+# KEYWORD_QUERY_MAX_TERMS terms, no question words, each term in at most
+# KEYWORD_QUERY_MAX_DOC_SHARE of the chunks) skip the embedding call and use
+# BM25 alone.
+VECTOR_SEARCH_K = int(os.getenv("VECTOR_SEARCH_K", "8"))
+BM25_SEARCH_K = int(os.getenv("BM25_SEARCH_K", "8"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "8"))
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() in ("1", "true", "yes")
+RERANK_CUTOFF = float(os.getenv("RERANK_CUTOFF", "0.35"))
+RERANK_MIN_CHUNKS = int(os.getenv("RERANK_MIN_CHUNKS", "2"))
+KEYWORD_QUERY_MAX_TERMS = int(os.getenv("KEYWORD_QUERY_MAX_TERMS", "2"))
+KEYWORD_QUERY_MAX_DOC_SHARE = float(os.getenv("KEYWORD_QUERY_MAX_DOC_SHARE", "0.2"))
 
-        return formatted_messages
+# Dense retrieval backend. "exact" searches an in-memory NumPy matrix of every
+# chunk embedding, exported with each index version and memory-mapped;
+# "chroma" uses Chroma's HNSW index; "auto" uses exact search for indexes of
+# at most EXACT_INDEX_MAX_CHUNKS chunks and Chroma above that. At 5000 chunks
+# of 1536 dimensions the matrix is about 30 MB.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+EXACT_INDEX_MAX_CHUNKS = int(os.getenv("EXACT_INDEX_MAX_CHUNKS", "5000"))
+VECTOR_BACKENDS = ("auto", "exact", "chroma")
 
-    async def generate_response(self, messages: List[Dict[str, str]]) -> str:
-        """Generate a response using LangChain with RAG."""
-        try:
-            # Extract user message (the last user message)
-            user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
-            if not user_messages:
-                return "I didn't receive a question. How can I help you?"
-            
-            user_query = user_messages[-1]
-            
-            # Extract chat history for context
-            chat_history = []
-            for i in range(0, len(messages) - 1, 2):
-                if i + 1 < len(messages):
-                    if messages[i]["role"] == "user" and messages[i+1]["role"] == "assistant":
-                        chat_history.append((messages[i]["content"], messages[i+1]["content"]))
-            
-            # Get more relevant documents from vector store
-            docs = self.chroma.similarity_search(user_query, k=8)  # Increased number of chunks
-            
-            print(f"\nRetrieved {len(docs)} documents for query: {user_query}")
-            for doc in docs:
-                print(f"- Source: {doc.metadata.get('source', 'Unknown source')}")
-                print(f"  Content: {doc.page_content[:100]}...")
-            
-            # Create context from relevant documents with source information
-            context_parts = []
-            for doc in docs:
-                source = doc.metadata.get('source', 'Unknown source').split('/')[-1]
-                context_parts.append(f"From {source}:\n{doc.page_content}")
-            context = "\n\n".join(context_parts)
-            
-            # Add context to the system message with improved instructions
-            system_message = f"""You are a helpful assistant with access to Jason's personal information. Use the following context to answer questions about Jason accurately and directly:
+# Prompt budget: total tokens sent to the LLM, the share reserved for
+# retrieved context, and the size of the rolling summary of older turns
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.6"))
+PROMPT_SUMMARY_MAX_TOKENS = int(os.getenv("PROMPT_SUMMARY_MAX_TOKENS", "300"))
+
+# Server-side chat sessions: at most SESSION_MAX_ENTRIES in memory, expired
+# after SESSION_TTL_SECONDS idle, keeping the last SESSION_MAX_MESSAGES
+# messages. With SESSION_DIR set, sessions are also saved there and shared by
+# every worker using the same directory.
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+SESSION_DIR = os.getenv("SESSION_DIR") or None
+
+SYSTEM_PROMPT_TEMPLATE = """You are a helpful assistant with access to Jason's personal information. Use the following context to answer questions about Jason accurately and directly:
 
 Context:
 {context}
@@ -162,70 +149,949 @@ Important:
 6. Never acknowledge that information is missing from the context.
 7. Never use conditional language like "likely", "probably", or "may have".
 8. Always speak in definitive terms about Jason's experience."""
-            
-            # Format messages with context
-            formatted_messages = [SystemMessage(content=system_message)]
-            formatted_messages.extend(self.format_messages(messages))
-            
-            # Generate response
-            response = self.llm.invoke(formatted_messages)
-            return response.content
-            
+
+NO_QUESTION_RESPONSE = "I didn't receive a question. How can I help you?"
+
+
+def create_llm():
+    return create_llm_backend(LLM_BACKEND)
+
+
+def create_embeddings() -> CachedEmbeddings:
+    """Embedding model behind a persistent cache, so documents and questions
+    that were embedded before skip the embedding round-trip"""
+    return CachedEmbeddings(
+        create_embedding_backend(EMBEDDING_BACKEND),
+        EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+    )
+
+
+@dataclass
+class ChatAnswer:
+    content: str
+    cache_hit: bool = False
+    # The content is an error message, not an answer to keep in a conversation
+    error: bool = False
+
+
+class LLMService:
+    """RAG chat service.
+
+    Construction is cheap; the LLM client, embeddings and the persisted index
+    are opened by warm_up(), which the app runs once in the background at
+    startup. `ready` flips to True when the index is usable.
+    """
+
+    def __init__(self, role: Optional[str] = None):
+        self.role = role or INDEX_ROLE
+        if self.role not in INDEX_ROLES:
+            raise ValueError(f"Unknown INDEX_ROLE {self.role!r}; expected one of {', '.join(INDEX_ROLES)}")
+        if VECTOR_BACKEND not in VECTOR_BACKENDS:
+            raise ValueError(
+                f"Unknown VECTOR_BACKEND {VECTOR_BACKEND!r}; expected one of {', '.join(VECTOR_BACKENDS)}"
+            )
+        self.llm = None
+        self.embeddings = None
+        # The active index; replaced as a whole when a reindex completes
+        self.index: Optional[IndexSnapshot] = None
+        self.index_versions = IndexVersions(CHROMA_DIR)
+        self.ready = False
+        self.startup_error: Optional[str] = None
+        self.reindex_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+        self.reindex_jobs: "OrderedDict[str, ReindexJob]" = OrderedDict()
+        self.job_store = JobStore(CHROMA_DIR, history=REINDEX_JOB_HISTORY)
+        self._reindex_lock = threading.Lock()
+        self._gc_timers: List[threading.Timer] = []
+        self.limiter = ConcurrencyLimiter(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS,
+            thread_name_prefix="retrieval"
+        )
+        self.response_cache = SemanticResponseCache(
+            threshold=RESPONSE_CACHE_THRESHOLD,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+        )
+        self.prompt_builder = PromptBuilder(
+            max_prompt_tokens=PROMPT_MAX_TOKENS,
+            context_share=PROMPT_CONTEXT_SHARE,
+            summary_max_tokens=PROMPT_SUMMARY_MAX_TOKENS
+        )
+        self.sessions = SessionStore(
+            max_sessions=SESSION_MAX_ENTRIES,
+            ttl_seconds=SESSION_TTL_SECONDS,
+            max_messages=SESSION_MAX_MESSAGES,
+            directory=SESSION_DIR
+        )
+        # Identical concurrent requests share one retrieval and one generation
+        self.inflight_retrievals = AsyncSingleFlight()
+        self.inflight_answers = AsyncSingleFlight()
+        self.inflight_streams = AsyncStreamSingleFlight()
+        self.register_metrics()
+
+    def register_metrics(self):
+        """Expose the statistics the caches, limiter and prompt builder keep on /metrics"""
+        def embedding_stat(key):
+            return lambda: self.embeddings.cache.stats()[key] if self.embeddings else 0
+
+        metrics = [
+            CallbackMetric("embedding_cache_hits_total", "Embedding cache hits", embedding_stat("hits"), "counter"),
+            CallbackMetric("embedding_cache_misses_total", "Embedding cache misses", embedding_stat("misses"), "counter"),
+            CallbackMetric("embedding_cache_hit_ratio", "Embedding cache hit ratio", embedding_stat("hit_rate")),
+            CallbackMetric("embedding_cache_entries", "Embeddings stored in the cache", embedding_stat("entries")),
+            CallbackMetric("response_cache_hits_total", "Semantic response cache hits",
+                           lambda: self.response_cache.hits, "counter"),
+            CallbackMetric("response_cache_misses_total", "Semantic response cache misses",
+                           lambda: self.response_cache.misses, "counter"),
+            CallbackMetric("response_cache_hit_ratio", "Semantic response cache hit ratio",
+                           lambda: self.response_cache.stats()["hit_rate"]),
+            CallbackMetric("response_cache_entries", "Answers stored in the semantic response cache",
+                           lambda: self.response_cache.stats()["entries"]),
+            CallbackMetric("chat_prompt_tokens_saved_total",
+                           "Prompt tokens removed by budgeting, deduplication and history compaction",
+                           lambda: self.prompt_builder.stats.tokens_saved_total, "counter"),
+            CallbackMetric("llm_active_requests", "Requests holding an LLM slot", lambda: self.limiter.active),
+            CallbackMetric("llm_waiting_requests", "Requests queued for an LLM slot", lambda: self.limiter.waiting),
+            CallbackMetric("index_chunks", "Chunks in the keyword index", lambda: len(self.bm25)),
+            CallbackMetric("index_exact_search", "1 if dense retrieval uses the exact in-memory index, 0 for Chroma",
+                           lambda: int(self.index is not None and self.index.vectors is not None)),
+            CallbackMetric("chat_sessions", "Chat sessions held in memory", lambda: self.sessions.stats()["sessions"]),
+            CallbackMetric("index_builder_heartbeat_age_seconds",
+                           "Seconds since the index builder last reported, -1 if never (readers only)",
+                           self.builder_heartbeat_age),
+            CallbackMetric("coalesced_answers_total", "Chat requests that shared an in-flight generation",
+                           lambda: self.inflight_answers.coalesced, "counter"),
+            CallbackMetric("coalesced_streams_total", "Stream requests that joined an in-flight stream",
+                           lambda: self.inflight_streams.coalesced, "counter"),
+            CallbackMetric("coalesced_retrievals_total", "Retrievals that shared an in-flight lookup",
+                           lambda: self.inflight_retrievals.coalesced, "counter"),
+            CallbackMetric("coalesced_embeddings_total", "Texts that shared an in-flight embedding request",
+                           lambda: self.embeddings.inflight.coalesced if self.embeddings else 0, "counter"),
+        ]
+        for metric in metrics:
+            REGISTRY.register(metric)
+
+    @property
+    def chroma(self):
+        return self.index.chroma if self.index else None
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self.index.bm25 if self.index else BM25Index([])
+
+    @property
+    def corpus_version(self) -> str:
+        return self.index.corpus_version if self.index else ""
+
+    @property
+    def read_only(self) -> bool:
+        return self.role == "reader"
+
+    @property
+    def status(self) -> str:
+        """What the service is doing until it is ready, for the readiness probe"""
+        if self.ready:
+            return "ready"
+        if self.startup_error:
+            return "failed"
+        if self.read_only and self.embeddings is not None:
+            # Readers never create CHROMA_DIR; the builder does on its first build
+            return "waiting_for_builder" if not os.path.isdir(CHROMA_DIR) else "waiting_for_index"
+        return "starting"
+
+    def warm_up(self):
+        """Create the clients and open the index. Blocking; run it off the event loop."""
+        try:
+            if self.role != "builder":
+                self.llm = create_llm()
+                # May download the tokenizer; done here so no request waits for it
+                load_encoding()
+            self.embeddings = create_embeddings()
+            if self.read_only:
+                # Readers never write the index; watch_index() opens it once published
+                if not self.refresh_index():
+                    logger.info(f"Waiting for the index builder to publish an index in {CHROMA_DIR}")
+                    return
+            else:
+                self.open_or_build_index()
+            self.ready = True
+            logger.info("LLM service ready")
         except Exception as e:
-            print(f"Error in LLM response: {e}")
-            return f"I encountered an error: {str(e)}"
+            self.startup_error = str(e)
+            logger.exception("LLM service failed to start")
+            raise
+
+    def close(self):
+        self.retrieval_executor.shutdown(wait=False, cancel_futures=True)
+        self.reindex_executor.shutdown(wait=False, cancel_futures=True)
+        # Versions still awaiting deletion are collected at the next startup
+        for timer in self._gc_timers:
+            timer.cancel()
+
+    def create_indexer(self, index_dir: str) -> DocumentIndexer:
+        return DocumentIndexer(
+            DOCS_DIR,
+            index_dir,
+            read_workers=INGEST_READ_WORKERS,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            embed_max_in_flight=EMBED_MAX_IN_FLIGHT,
+            checkpoint_every=INGEST_CHECKPOINT_EVERY,
+            embedding_model=self.embeddings.model if self.embeddings else ""
+        )
+
+    def open_index(self, path: str):
+        """Open a persisted Chroma index version without touching its contents"""
+        from langchain_chroma import Chroma
+
+        if not self.read_only:
+            # Readers only open versions the builder created
+            os.makedirs(DOCS_DIR, exist_ok=True)
+            os.makedirs(path, exist_ok=True)
+        return Chroma(
+            persist_directory=path,
+            embedding_function=self.embeddings
+        )
+
+    def open_snapshot(self, version: str) -> IndexSnapshot:
+        path = self.index_versions.path(version)
+        chroma = self.open_index(path)
+        indexer = self.create_indexer(path)
+        manifest = indexer.load_manifest()
+        if self.read_only and indexer.embedding_changed(manifest):
+            logger.warning(
+                f"Index version {version} was embedded with {manifest.get('embedding_model') or 'an unknown model'}, "
+                f"not {indexer.embedding_model}; check that every process uses the same EMBEDDING_BACKEND"
+            )
+        return self.create_snapshot(version, path, chroma, manifest["corpus_version"])
+
+    def create_snapshot(self, version: str, path: str, chroma, corpus_version: str) -> IndexSnapshot:
+        vectors = self.open_exact_index(path, chroma, corpus_version)
+        bm25 = BM25Index(vectors.docs) if vectors is not None else BM25Index.from_vectorstore(chroma)
+        return IndexSnapshot(version, path, chroma, bm25, corpus_version, vectors)
 
-    async def generate_streaming_response(self, messages: List[Dict[str, str]]):
-        """Generate a streaming response using LangChain with RAG."""
+    def open_exact_index(self, path: str, chroma, corpus_version: str) -> Optional[ExactVectorIndex]:
+        """The exact-search index for a version, or None where Chroma serves dense search.
+
+        Writers export the matrix into the version directory so readers can
+        memory-map it instead of each copying it out of Chroma.
+        """
+        if VECTOR_BACKEND == "chroma":
+            return None
+        if VECTOR_BACKEND == "auto" and chroma._collection.count() > EXACT_INDEX_MAX_CHUNKS:
+            return None
+        vectors = ExactVectorIndex.load(path, corpus_version, self.embeddings)
+        if vectors is None:
+            vectors = ExactVectorIndex.from_vectorstore(chroma, self.embeddings)
+            if not self.read_only:
+                vectors.save(path, corpus_version)
+        return vectors
+
+    def open_or_build_index(self):
+        """Open the active index version, building the first one if there is none.
+
+        A published version is never modified in place: if documents changed
+        while the service was down, the update goes into a new version.
+        """
+        version = self.index_versions.current() or self.index_versions.adopt_legacy()
+        if version is None:
+            # Resume an interrupted first build rather than starting over
+            versions = self.index_versions.list_versions()
+            version = versions[-1] if versions else self.index_versions.create()
+            self.load_documents(version)
+            self.index_versions.activate(version)
+        else:
+            self.index = self.open_snapshot(version)
+            indexer = self.create_indexer(self.index.path)
+            # Vectors from another embedding model can't be queried, so a model
+            # change is synced even with INDEX_SYNC_ON_STARTUP disabled
+            if indexer.embedding_changed() or (INDEX_SYNC_ON_STARTUP and indexer.needs_sync()):
+                self.reload_documents()
+        # Versions left by earlier runs; recent ones may still be read by other processes
+        self.index_versions.collect_garbage(keep=[self.index.version], min_age_seconds=INDEX_GC_GRACE_SECONDS)
+
+    def load_documents(self, version: str):
+        """Build an unpublished index version in place"""
         try:
-            # Extract user message (the last user message)
-            user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
-            if not user_messages:
-                yield "I didn't receive a question. How can I help you?"
-                return
-            
-            user_query = user_messages[-1]
-            
-            # Extract chat history for context
-            chat_history = []
-            for i in range(0, len(messages) - 1, 2):
-                if i + 1 < len(messages):
-                    if messages[i]["role"] == "user" and messages[i+1]["role"] == "assistant":
-                        chat_history.append((messages[i]["content"], messages[i+1]["content"]))
-            
-            # Get relevant documents from vector store
-            docs = self.chroma.similarity_search(user_query, k=3)
-            
-            # Create context from relevant documents
-            context = "\n".join([doc.page_content for doc in docs])
-            
-            # Add context to the system message
-            system_message = f"""You are a helpful assistant. Use the following context to answer the user's question:
+            path = self.index_versions.path(version)
+            chroma = self.open_index(path)
+            result = self.create_indexer(path).sync(chroma)
+            self.index = self.create_snapshot(version, path, chroma, result.corpus_version)
+            logger.info(
+                f"Successfully indexed documents: {result.added} added, {result.updated} updated, "
+                f"{result.removed} removed, {result.unchanged} unchanged "
+                f"({result.chunks_embedded} chunks embedded)"
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Error loading documents: {str(e)}")
+            raise
 
-Context:
-{context}
+    def reload_documents(self, job: Optional[ReindexJob] = None) -> IndexSyncResult:
+        """Build a new index version with the documents that changed and swap it in.
+
+        The active version is copied and synced incrementally in a new
+        directory while requests keep reading the active snapshot, then the
+        snapshot reference is replaced in one assignment and the version is
+        published to other processes through CURRENT. Blocking; runs on the
+        reindex thread.
+        """
+        if self.read_only:
+            raise RuntimeError("This process opens the index read-only")
+        current = self.index
+        if current is None:
+            raise RuntimeError("Index is not open")
+
+        active = self.create_indexer(current.path)
+        if not active.needs_sync():
+            # Nothing to change: keep serving the active version rather than copying it
+            if job is not None:
+                job.version = current.version
+            logger.info(f"Documents unchanged; keeping index version {current.version}")
+            return IndexSyncResult(
+                unchanged=len(active.load_manifest()["files"]),
+                corpus_version=current.corpus_version
+            )
+
+        version = self.index_versions.create(base=current.version)
+        path = self.index_versions.path(version)
+        chroma = None
+        try:
+            indexer = self.create_indexer(path)
+            progress_callback = None
+            if job is not None:
+                job.version = version
+                job.indexer = indexer
+                progress_callback = self.job_progress_saver(job)
+            chroma = self.open_index(path)
+            result = indexer.sync(chroma, progress_callback=progress_callback)
+            snapshot = self.create_snapshot(version, path, chroma, result.corpus_version)
+        except Exception as e:
+            logger.error(f"Error reloading documents: {str(e)}")
+            if chroma is not None:
+                close_vectorstore(chroma)
+            self.index_versions.remove(version)
+            raise
+
+        self.index_versions.activate(version)
+        self.index = snapshot
+        self.response_cache.purge_corpus_versions(result.corpus_version)
+        self.retire_index(current)
+        logger.info(
+            f"Successfully reloaded documents into index version {version}: {result.added} added, "
+            f"{result.updated} updated, {result.removed} removed, {result.unchanged} unchanged "
+            f"({result.chunks_embedded} chunks embedded)"
+        )
+        return result
+
+    def refresh_index(self) -> bool:
+        """Switch a reader to the version named by CURRENT, if it changed.
 
-Please provide a response based on the context above. If the context doesn't contain relevant information, you can provide a general response."""
-            
-            # Format messages with context
-            formatted_messages = [SystemMessage(content=system_message)]
-            formatted_messages.extend(self.format_messages(messages))
-            
-            # Stream the response
-            for chunk in self.llm.stream(formatted_messages):
-                if hasattr(chunk, "content"):
-                    yield chunk.content
-                else:
-                    # Fallback in case the chunk structure is different
-                    yield chunk.get("content", "")
-                    
+        Returns True if a new snapshot was swapped in.
+        """
+        version = self.index_versions.current()
+        current = self.index
+        if version is None or (current is not None and current.version == version):
+            return False
+        snapshot = self.open_snapshot(version)
+        self.index = snapshot
+        self.ready = True
+        self.response_cache.purge_corpus_versions(snapshot.corpus_version)
+        if current is not None:
+            self.retire_index(current)
+        logger.info(f"Switched to index version {version}")
+        return True
+
+    async def watch_index(self):
+        """Follow the index versions published by the builder process (readers only)"""
+        while True:
+            await asyncio.sleep(INDEX_POLL_SECONDS)
+            try:
+                await asyncio.to_thread(self.refresh_index)
+            except Exception:
+                logger.exception("Failed to open the published index version")
+
+    def retire_index(self, snapshot: IndexSnapshot):
+        """Release a replaced index version once in-flight requests are done with it.
+
+        The process that wrote the version also deletes it; readers only
+        close their client.
+        """
+        def collect():
+            close_vectorstore(snapshot.chroma)
+            if not self.read_only:
+                self.index_versions.remove(snapshot.version)
+                logger.info(f"Removed index version {snapshot.version}")
+
+        timer = threading.Timer(INDEX_GC_GRACE_SECONDS, collect)
+        timer.daemon = True
+        self._gc_timers = [t for t in self._gc_timers if t.is_alive()] + [timer]
+        timer.start()
+
+    def start_reindex(self) -> Dict[str, object]:
+        """Queue a background reindex, or return the one already waiting to start.
+
+        Jobs run one at a time; a request made while a job is running queues
+        one more, so changes made during that run are picked up too. Readers
+        queue the job in the shared job store for the builder process.
+        """
+        with self._reindex_lock:
+            if self.read_only:
+                queued = self.job_store.queued()
+                if queued:
+                    return self.check_builder(queued[0])
+                job = ReindexJob()
+                self.job_store.save(job)
+                return self.check_builder(job.to_dict())
+
+            for job in self.reindex_jobs.values():
+                if job.state == "queued":
+                    return job.to_dict()
+            job = ReindexJob()
+            self.enqueue_reindex_job(job)
+            return job.to_dict()
+
+    def enqueue_reindex_job(self, job: ReindexJob):
+        """Track and submit a job; the caller holds _reindex_lock"""
+        self.reindex_jobs[job.id] = job
+        while len(self.reindex_jobs) > REINDEX_JOB_HISTORY:
+            oldest = next(iter(self.reindex_jobs.values()))
+            if not oldest.done:
+                break
+            self.reindex_jobs.popitem(last=False)
+        self.job_store.save(job)
+        self.reindex_executor.submit(self.run_reindex_job, job)
+
+    def adopt_queued_jobs(self):
+        """Run the jobs readers queued in the shared job store (builder only)"""
+        with self._reindex_lock:
+            for queued in self.job_store.queued():
+                if queued["job_id"] not in self.reindex_jobs:
+                    self.enqueue_reindex_job(ReindexJob(id=queued["job_id"], created_at=queued["created_at"]))
+
+    def get_reindex_job(self, job_id: str) -> Optional[Dict[str, object]]:
+        job = self.reindex_jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        stored = self.job_store.load(job_id)
+        return self.check_builder(stored) if stored is not None and self.read_only else stored
+
+    def builder_heartbeat_age(self) -> float:
+        if not self.read_only:
+            return 0.0
+        last_seen = self.job_store.builder_last_seen()
+        return time.time() - last_seen if last_seen is not None else -1.0
+
+    def check_builder(self, job: Dict[str, object]) -> Dict[str, object]:
+        """Report an unfinished job as stale when no builder is there to run it (readers only).
+
+        The job stays queued in the store, so a builder that comes back still runs it.
+        """
+        age = self.builder_heartbeat_age()
+        if job["state"] in ("queued", "running") and (age < 0 or age > BUILDER_HEARTBEAT_TIMEOUT):
+            seen = f"for {age:.0f}s" if age >= 0 else "yet"
+            job = {
+                **job,
+                "state": "stale",
+                "error": f"No index builder heartbeat {seen}; is python -m app.index_builder running?",
+            }
+        return job
+
+    def job_progress_saver(self, job: ReindexJob, interval: float = 1.0):
+        """Progress callback that writes the job status file at most every `interval` seconds"""
+        last_saved = 0.0
+
+        def save(_progress):
+            nonlocal last_saved
+            if time.monotonic() - last_saved >= interval:
+                last_saved = time.monotonic()
+                self.job_store.save(job)
+
+        return save
+
+    def run_reindex_job(self, job: ReindexJob):
+        with self._reindex_lock:
+            job.state = "running"
+            job.started_at = time.time()
+        self.job_store.save(job)
+        try:
+            job.result = self.reload_documents(job)
+            job.finished_at = time.time()
+            job.state = "succeeded"
         except Exception as e:
-            print(f"Error in streaming response: {e}")
-            yield f"I encountered an error: {str(e)}"
+            logger.exception(f"Reindex job {job.id} failed")
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.state = "failed"
+        self.job_store.save(job)
+        self.job_store.prune()
+
+    @staticmethod
+    def format_message(message: Dict[str, str]) -> Optional[Any]:
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+        if message["role"] == "system":
+            return SystemMessage(content=message["content"])
+        elif message["role"] == "user":
+            return HumanMessage(content=message["content"])
+        elif message["role"] == "assistant":
+            return AIMessage(content=message["content"])
+        return None
+
+    def format_messages(self, messages: List[Dict[str, str]], session: Optional[ChatSession] = None) -> List[Any]:
+        """Convert messages from the frontend format to LangChain format.
+
+        With a session, each message is converted once and reused on later turns.
+        """
+        if session is None:
+            formatted_messages = [self.format_message(message) for message in messages]
+        else:
+            # The system prompt carries this turn's context, so it is never reused
+            formatted_messages = [self.format_message(messages[0])] + [
+                session.format_message(message, self.format_message) for message in messages[1:]
+            ]
+        return [message for message in formatted_messages if message is not None]
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call (embedding, vector search) on the bounded retrieval thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.retrieval_executor, func, *args)
+
+    async def embed_query(self, query: str) -> List[float]:
+        with span("query_embedding"):
+            return await self.run_blocking(self.embeddings.embed_query, query)
+
+    async def similarity_search_by_vector(self, index: IndexSnapshot, vector: List[float], k: int):
+        with span("vector_search"):
+            return await self.run_blocking(lambda: index.vector_search.similarity_search_by_vector(vector, k=k))
+
+    @staticmethod
+    def last_user_message(messages: List[Dict[str, str]]) -> Optional[str]:
+        user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
+        return user_messages[-1] if user_messages else None
+
+    @staticmethod
+    def history_key(messages: List[Dict[str, str]], session: Optional[ChatSession] = None) -> str:
+        """conversation_key() of `messages`; a session keeps it up to date as turns are added.
+
+        The session's key applies while `messages` is its history plus one
+        new message, i.e. unless another turn finished in the meantime.
+        """
+        if session is not None and len(messages) == len(session.messages) + 1:
+            return session.history_key()
+        return conversation_key(messages)
+
+    def cache_scope(self, messages: List[Dict[str, str]], session: Optional[ChatSession] = None) -> Tuple[str, str]:
+        """Answers are only shared between identical conversation states on the same corpus"""
+        return self.history_key(messages, session), self.corpus_version
+
+    def flight_key(self, messages: List[Dict[str, str]], session: Optional[ChatSession] = None) -> Tuple[str, str, str]:
+        """Requests with the same normalized question and conversation state on the
+        same corpus are answered by one shared generation"""
+        return (
+            self.history_key(messages, session),
+            normalize_text(self.last_user_message(messages) or "").casefold(),
+            self.corpus_version
+        )
+
+    def is_keyword_query(self, query: str) -> bool:
+        return self.bm25.is_keyword_query(query, KEYWORD_QUERY_MAX_TERMS, KEYWORD_QUERY_MAX_DOC_SHARE)
+
+    async def retrieve(self, query: str, session: Optional[ChatSession] = None):
+        """Retrieve context chunks; concurrent lookups of the same query share one search.
+
+        A session remembers its recent results, so asking again in the same
+        session on the same index version doesn't search again.
+        """
+        index = self.index
+        key = (index.version, normalize_text(query).casefold())
+        docs = session.cached_retrieval(key) if session is not None else None
+        if docs is None:
+            docs, _ = await self.inflight_retrievals.do(key, lambda: self.search_index(index, query))
+            if session is not None:
+                session.remember_retrieval(key, docs)
+        return docs
+
+    async def search_index(self, index: IndexSnapshot, query: str):
+        """Hybrid retrieval: BM25 and vector search fused with reciprocal-rank fusion.
+
+        Keyword queries are answered from BM25 alone, without embedding the
+        query. The reranker then trims the fused list to the chunks that clear
+        RERANK_CUTOFF. The whole lookup reads one index snapshot, even if a
+        reindex swaps in a new one meanwhile.
+        """
+        with span("keyword_search"):
+            keyword_docs, keyword_only = await self.run_blocking(self.keyword_search, index, query)
+        if keyword_only:
+            rankings = [keyword_docs]
+        else:
+            # The query embedding comes from the embedding cache, so the
+            # response cache lookup doesn't cost a second embedding call
+            query_vector = await self.embed_query(query)
+            vector_docs = await self.similarity_search_by_vector(index, query_vector, k=VECTOR_SEARCH_K)
+            rankings = [vector_docs, keyword_docs]
+        with span("rerank"):
+            return await self.run_blocking(self.fuse_rankings, index, query, rankings)
+
+    @staticmethod
+    def keyword_search(index: IndexSnapshot, query: str) -> Tuple[List[Any], bool]:
+        """BM25 results, and whether they are enough on their own (a keyword query)"""
+        bm25 = index.bm25
+        keyword_docs = [doc for doc, _ in bm25.search(query, BM25_SEARCH_K)]
+        keyword_only = bool(keyword_docs) and bm25.is_keyword_query(
+            query, KEYWORD_QUERY_MAX_TERMS, KEYWORD_QUERY_MAX_DOC_SHARE
+        )
+        return keyword_docs, keyword_only
+
+    @staticmethod
+    def fuse_rankings(index: IndexSnapshot, query: str, rankings: List[List[Any]]) -> List[Any]:
+        fused = reciprocal_rank_fusion(rankings)
+        if not RERANK_ENABLED:
+            return [doc for doc, _ in fused[:CONTEXT_MAX_CHUNKS]]
+        return rerank(
+            query,
+            fused,
+            index.bm25,
+            cutoff=RERANK_CUTOFF,
+            min_docs=RERANK_MIN_CHUNKS,
+            max_docs=CONTEXT_MAX_CHUNKS
+        )
+
+    @staticmethod
+    def search_vectors(index: IndexSnapshot, vectors: List[List[float]], k: int) -> List[List[Any]]:
+        """Vector search for many query vectors; one matrix product with the exact index"""
+        search = index.vector_search
+        if isinstance(search, ExactVectorIndex):
+            return search.similarity_search_by_vectors(vectors, k=k)
+        return [search.similarity_search_by_vector(vector, k=k) for vector in vectors]
+
+    async def retrieve_many(self, queries: List[str]) -> Tuple[List[List[Any]], List[Optional[List[float]]]]:
+        """Retrieve context for many queries together.
+
+        All queries that need vector search are embedded in one batched call
+        and searched in one pass. Returns the chunks for each query and its
+        embedding (None for keyword queries, which are not embedded).
+        """
+        index = self.index
+        # BM25 and reranking for hundreds of questions take long enough to
+        # stall interactive requests, so they run on the retrieval pool too
+        with span("keyword_search"):
+            keyword_results = await self.run_blocking(
+                lambda: [self.keyword_search(index, query) for query in queries]
+            )
+        dense = [i for i, (_, keyword_only) in enumerate(keyword_results) if not keyword_only]
+
+        vectors: List[Optional[List[float]]] = [None] * len(queries)
+        vector_docs: Dict[int, List[Any]] = {}
+        if dense:
+            # Stored in the embedding cache, where embed_query() finds them later
+            with span("query_embedding"):
+                embedded = await self.run_blocking(self.embeddings.embed_documents, [queries[i] for i in dense])
+            with span("vector_search"):
+                found = await self.run_blocking(self.search_vectors, index, embedded, VECTOR_SEARCH_K)
+            for i, vector, docs in zip(dense, embedded, found):
+                vectors[i] = vector
+                vector_docs[i] = docs
+
+        def fuse_all() -> List[List[Any]]:
+            results = []
+            for i, (query, (keyword_docs, _)) in enumerate(zip(queries, keyword_results)):
+                rankings = [vector_docs[i], keyword_docs] if i in vector_docs else [keyword_docs]
+                results.append(self.fuse_rankings(index, query, rankings))
+            return results
+
+        with span("rerank"):
+            results = await self.run_blocking(fuse_all)
+        return results, vectors
+
+    async def find_cached_response(
+        self,
+        messages: List[Dict[str, str]],
+        session: Optional[ChatSession] = None
+    ) -> Optional[str]:
+        """Return a cached answer for the same or a semantically equivalent question, if any.
+
+        Keyword queries are never embedded, so they only match the same
+        normalized question text.
+        """
+        user_query = self.last_user_message(messages)
+        if user_query is None or not self.response_cache.enabled:
+            return None
+        vector = None if self.is_keyword_query(user_query) else await self.embed_query(user_query)
+        scope = self.cache_scope(messages, session)
+        with span("cache_lookup"):
+            cached = await self.run_blocking(self.response_cache.lookup, vector, scope, user_query)
+        return cached.answer if cached else None
+
+    async def build_prompt(
+        self,
+        messages: List[Dict[str, str]],
+        session: Optional[ChatSession] = None,
+        docs: Optional[List[Any]] = None
+    ) -> Optional[List[Any]]:
+        """Retrieve context for the last user message and assemble the LLM prompt.
+
+        Returns None when the conversation contains no user message. With a
+        session, work cached by its earlier turns is reused; `docs` skips
+        retrieval when the context was already retrieved.
+        """
+        # Extract user message (the last user message)
+        user_query = self.last_user_message(messages)
+        if user_query is None:
+            return None
+        
+        # Get the most relevant chunks from the keyword and vector indexes
+        if docs is None:
+            docs = await self.retrieve(user_query, session)
+
+        # Fit context and conversation history into the prompt token budget
+        with span("prompt_assembly"):
+            prompt = self.prompt_builder.build(
+                SYSTEM_PROMPT_TEMPLATE,
+                docs,
+                messages,
+                conversation_id=session.id if session is not None else None
+            )
+            formatted_messages = self.format_messages(prompt.messages, session)
+        PROMPT_TOKENS.observe(prompt.prompt_tokens)
+        # Recorded on the request trace; the slow-request log shows them
+        annotate(
+            query=user_query[:200],
+            sources=sorted({doc.metadata.get("source", "Unknown source").split("/")[-1] for doc in docs}),
+            retrieved_chunks=len(docs),
+            context_chunks=prompt.context_chunks,
+            prompt_tokens=prompt.prompt_tokens,
+            prompt_tokens_saved=prompt.tokens_saved,
+            summarized_turns=prompt.summarized_turns
+        )
+        return formatted_messages
+
+    @staticmethod
+    def record_completion(answer: str):
+        tokens = count_tokens(answer)
+        COMPLETION_TOKENS.inc(tokens)
+        annotate(completion_tokens=tokens)
+
+    async def answer(self, messages: List[Dict[str, str]], session: Optional[ChatSession] = None) -> ChatAnswer:
+        """Answer from the semantic cache when possible, otherwise with LangChain RAG.
+
+        `session` is the server-side session `messages` belongs to, if any.
+        """
+        user_query = self.last_user_message(messages)
+        if user_query is None:
+            return ChatAnswer(NO_QUESTION_RESPONSE)
+
+        with request_trace("chat") as trace:
+            try:
+                cached = await self.find_cached_response(messages, session)
+            except Exception:
+                logger.exception("Error in response cache lookup")
+                cached = None
+            if cached is not None:
+                trace.outcome = "hit"
+                return ChatAnswer(cached, cache_hit=True)
 
-# Initialize the service
-llm_service = LLMService()
+            answer, leader = await self.inflight_answers.do(
+                self.flight_key(messages, session),
+                lambda: self.generate_answer(messages, session)
+            )
+            if answer.error:
+                trace.outcome = "error"
+            elif not leader:
+                trace.outcome = "coalesced"
+            return answer
+
+    async def generate_answer(
+        self,
+        messages: List[Dict[str, str]],
+        session: Optional[ChatSession] = None,
+        docs: Optional[List[Any]] = None,
+        always_wait: bool = False
+    ) -> ChatAnswer:
+        """Retrieve, prompt and call the LLM once; shared by coalesced requests.
+
+        Failures are returned as an answer with `error` set, so every coalesced
+        caller sees them. With `always_wait` it queues for an LLM slot even
+        when the queue is full.
+        """
+        async with self.limiter.slot(always_wait):
+            try:
+                formatted_messages = await self.build_prompt(messages, session, docs)
+
+                # Generate response
+                with span("llm_completion"):
+                    response = await self.llm.ainvoke(formatted_messages)
+                self.record_completion(response.content)
+                await self.store_response(messages, response.content, session)
+                return ChatAnswer(response.content)
+
+            except Exception as e:
+                logger.exception("Error in LLM response")
+                return ChatAnswer(f"I encountered an error: {str(e)}", error=True)
+
+    async def generate_response(self, messages: List[Dict[str, str]]) -> str:
+        """Generate a response using LangChain with RAG."""
+        return (await self.answer(messages)).content
+
+    async def store_response(
+        self,
+        messages: List[Dict[str, str]],
+        answer: str,
+        session: Optional[ChatSession] = None
+    ):
+        """Remember a generated answer for the same or semantically equivalent future questions"""
+        user_query = self.last_user_message(messages)
+        if user_query is None or not answer or not self.response_cache.enabled:
+            return
+        # The query embedding was computed (and cached) while building the
+        # prompt; keyword queries are stored under their text only
+        vector = None if self.is_keyword_query(user_query) else await self.embed_query(user_query)
+        scope = self.cache_scope(messages, session)
+        await self.run_blocking(self.response_cache.store, user_query, vector, answer, scope)
+
+    async def generate_streaming_response(
+        self,
+        messages: List[Dict[str, str]],
+        trace: Optional[RequestTrace] = None,
+        session: Optional[ChatSession] = None
+    ) -> AsyncIterator[str]:
+        """Generate a streaming response using LangChain with RAG.
+
+        Uses the same retrieval and prompt as generate_response. Errors are
+        raised to the caller, which reports them to the client as an SSE event.
+        Identical concurrent requests receive the same token stream from one
+        generation. `trace` continues a request trace started by the caller
+        (e.g. around its cache lookup); it is finished when the stream ends.
+        """
+        trace = trace or RequestTrace("stream")
+        with activate_trace(trace):
+            try:
+                if self.last_user_message(messages) is None:
+                    yield NO_QUESTION_RESPONSE
+                    return
+
+                key = self.flight_key(messages, session)
+                if not self.inflight_streams.is_leader(key):
+                    trace.outcome = "coalesced"
+                async for token in self.inflight_streams.subscribe(key, lambda: self.stream_answer(messages, session)):
+                    yield token
+            except (asyncio.CancelledError, GeneratorExit):
+                trace.outcome = "cancelled"
+                raise
+            except Exception:
+                trace.outcome = "error"
+                raise
+            finally:
+                trace.finish()
+
+    async def stream_answer(
+        self,
+        messages: List[Dict[str, str]],
+        session: Optional[ChatSession] = None
+    ) -> AsyncIterator[str]:
+        """Retrieve, prompt and stream the LLM answer once; fanned out to coalesced requests"""
+        async with self.limiter.slot():
+            formatted_messages = await self.build_prompt(messages, session)
+
+            # Stream the response without blocking the event loop between tokens
+            parts = []
+            with span("llm_completion"):
+                started_at = time.perf_counter()
+                async for chunk in self.llm.astream(formatted_messages):
+                    if chunk.content:
+                        if not parts:
+                            record_stage("llm_first_token", time.perf_counter() - started_at)
+                        parts.append(chunk.content)
+                        yield chunk.content
+            answer = "".join(parts)
+            self.record_completion(answer)
+            await self.store_response(messages, answer, session)
+
+    async def answer_batch(
+        self,
+        questions: List[str],
+        use_cache: bool = True,
+        concurrency: int = BATCH_LLM_CONCURRENCY
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Answer many independent questions, yielding a record per question as it completes.
+
+        Context for all questions is retrieved together (see retrieve_many),
+        then at most `concurrency` generations run at a time, each also
+        holding an LLM slot. A batch waits for LLM slots rather than failing
+        when interactive requests fill the queue. Result records carry the question's position in
+        `index`, its sources and stage timings, and arrive in completion
+        order; a summary record comes last. With `use_cache` false every
+        question is generated afresh.
+        """
+        batch = RequestTrace("batch")
+        with activate_trace(batch):
+            docs_per_question, vectors = await self.retrieve_many(questions)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def answer_one(index: int, question: str, docs: List[Any], vector) -> Dict[str, Any]:
+            messages = [{"role": "user", "content": question}]
+            error = None
+            with request_trace("batch") as trace:
+                try:
+                    cached = None
+                    if use_cache and self.response_cache.enabled:
+                        with span("cache_lookup"):
+                            cached = await self.run_blocking(
+                                self.response_cache.lookup, vector, self.cache_scope(messages), question
+                            )
+                    if cached is not None:
+                        trace.outcome = "hit"
+                        answer = cached.answer
+                    else:
+                        # Waiting behind the batch's own generations, not for the LLM
+                        with span("batch_queue"):
+                            await semaphore.acquire()
+                        try:
+                            generated, leader = await self.inflight_answers.do(
+                                self.flight_key(messages),
+                                lambda: self.generate_answer(messages, docs=docs, always_wait=True)
+                            )
+                        finally:
+                            semaphore.release()
+                        answer = generated.content
+                        if generated.error:
+                            trace.outcome = "error"
+                        elif not leader:
+                            trace.outcome = "coalesced"
+                except ServiceBusyError as e:
+                    # Only from an interactive request this question joined
+                    trace.outcome = "error"
+                    answer = str(e)
+                if trace.outcome == "error":
+                    error, answer = answer, None
+                details = trace.to_dict()
+            details.pop("endpoint", None)
+            details.pop("query", None)
+            details["sources"] = sorted({
+                doc.metadata.get("source", "Unknown source").split("/")[-1] for doc in docs
+            })
+            return {"type": "result", "index": index, "question": question, "answer": answer, "error": error, **details}
+
+        tasks = [
+            asyncio.ensure_future(answer_one(i, question, docs, vector))
+            for i, (question, docs, vector) in enumerate(zip(questions, docs_per_question, vectors))
+        ]
+        outcomes: Dict[str, int] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
 
-# Get response from LLM
-async def get_llm_response(messages: List[Dict[str, str]]) -> str:
-    return await llm_service.generate_response(messages)
\ No newline at end of file
+        summary = batch.to_dict()
+        summary.pop("endpoint")
+        summary.pop("outcome")
+        yield {
+            "type": "summary",
+            "questions": len(questions),
+            "outcomes": outcomes,
+            "corpus_version": self.corpus_version,
+            **summary,
+        }
@@ -0,0 +1,164 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Minimal Prometheus text-format (0.0.4) metrics, enough for the /metrics endpoint
+# without adding a client library dependency.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose value is read from a callable at scrape time.
+
+    Used for statistics the caches and limiter already keep themselves.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], type_name: str = "gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.type_name = type_name
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, (list(counts), list(totals))) for key, (counts, totals) in self._values.items())
+        for key, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, replacing any earlier one with the same name"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of the chat pipeline",
+    labels=("stage",)
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "chat_request_duration_seconds",
+    "End-to-end chat request latency",
+    labels=("endpoint", "outcome")
+))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "chat_prompt_tokens",
+    "Prompt tokens sent to the LLM per request",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+))
+COMPLETION_TOKENS = REGISTRY.register(Counter(
+    "chat_completion_tokens_total",
+    "Completion tokens generated by the LLM"
+))
@@ -1,7 +1,16 @@
-from typing import List, Dict
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterator
 
 async def get_mock_response(messages: List[Dict[str, str]]) -> str:
     """Generate a mock response for testing purposes."""
+    return mock_response_text(messages)
+
+def mock_response_text(messages: List[Dict[str, str]]) -> str:
+    """Keyword lookup behind get_mock_response and FakeChatModel."""
     # Extract the last user message
     user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
     if not user_messages:
@@ -27,4 +36,92 @@ async def get_mock_response(messages: List[Dict[str, str]]) -> str:
             return response
     
     # Return default response if no keywords match
-    return responses["default"] 
\ No newline at end of file
+    return responses["default"]
+
+
+class FakeMessage:
+    """Minimal stand-in for a LangChain AIMessage / AIMessageChunk."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+def _to_role_messages(messages: List[Any]) -> List[Dict[str, str]]:
+    """Convert LangChain messages (or frontend-style dicts) to role/content dicts."""
+    roles = {"human": "user", "ai": "assistant", "system": "system"}
+    converted = []
+    for message in messages:
+        if isinstance(message, dict):
+            converted.append(message)
+        else:
+            converted.append({"role": roles.get(getattr(message, "type", ""), "user"), "content": message.content})
+    return converted
+
+
+class FakeChatModel:
+    """Deterministic local LLM for benchmarks and offline runs.
+
+    Answers with the keyword lookup above after `latency_ms`, then emits the
+    answer word by word at `tokens_per_second`. Implements the invoke/ainvoke/
+    stream/astream subset of the LangChain chat model interface that
+    LLMService uses.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, tokens_per_second: float = 50.0):
+        self.latency = latency_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def _tokens(self, messages: List[Any]) -> List[str]:
+        return re.findall(r"\S+\s*", mock_response_text(_to_role_messages(messages)))
+
+    def invoke(self, messages: List[Any]) -> FakeMessage:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_interval * len(tokens))
+        return FakeMessage("".join(tokens))
+
+    async def ainvoke(self, messages: List[Any]) -> FakeMessage:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self.token_interval * len(tokens))
+        return FakeMessage("".join(tokens))
+
+    def stream(self, messages: List[Any]) -> Iterator[FakeMessage]:
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            yield FakeMessage(token)
+            time.sleep(self.token_interval)
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[FakeMessage]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            yield FakeMessage(token)
+            await asyncio.sleep(self.token_interval)
+
+
+class HashingEmbeddings:
+    """Deterministic local embeddings using the hashing trick.
+
+    Words and word bigrams are hashed into a fixed number of signed buckets
+    and the result is L2-normalized, so texts sharing vocabulary end up close
+    together without any model or network call.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        words = re.findall(r"[a-z0-9+#.]+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = [0.0] * self.dimensions
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
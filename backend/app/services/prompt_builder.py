@@ -0,0 +1,320 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Shortest shared prefix/suffix treated as splitter overlap rather than coincidence
+MIN_CHUNK_OVERLAP = 20
+MAX_CHUNK_OVERLAP = 300
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Token counts remembered, keyed on a digest of the text
+TOKEN_COUNT_CACHE_ENTRIES = 8192
+_token_counts: "OrderedDict[bytes, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+# Characters per token assumed when no tiktoken encoding can be loaded
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def load_encoding():
+    """Load the tiktoken encoding, which downloads it on first use. Blocking; the
+    service calls it during warm-up so no request waits for it.
+
+    When it can't be loaded (e.g. offline) tokens are estimated from the text
+    length from then on, and that is logged once. Returns the encoding or None.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.encoding_for_model("gpt-4")
+            except Exception as e:
+                logger.warning(
+                    f"tiktoken encoding unavailable, estimating {CHARS_PER_TOKEN} characters per token: {e}"
+                )
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally; history messages repeat every turn, so results are memoized.
+
+    The memo holds a 16-byte digest per text, not the text itself.
+    """
+    encoding = _encoding if _encoding_loaded else load_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    count = len(encoding.encode(text, disallowed_special=()))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > TOKEN_COUNT_CACHE_ENTRIES:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def count_message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second`"""
+    longest = min(len(first), len(second), MAX_CHUNK_OVERLAP)
+    for size in range(longest, MIN_CHUNK_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def dedupe_chunks(docs: Sequence["Document"]) -> List[Tuple[str, str]]:
+    """(source, text) pairs with duplicates dropped and splitter overlap trimmed.
+
+    Adjacent chunks of one file share up to chunk_overlap characters; the
+    shared text is kept once. Retrieval order is preserved.
+    """
+    kept: List[Tuple[str, str, str]] = []
+    for doc in docs:
+        source = doc.metadata.get("source", "Unknown source")
+        original = text = doc.page_content
+        for other_source, other_original, _ in kept:
+            if other_source != source:
+                continue
+            if original in other_original:
+                text = ""
+                break
+            size = _overlap(other_original, text)
+            if size:
+                text = text[size:]
+            size = _overlap(text, other_original)
+            if size:
+                text = text[:-size]
+        if text.strip():
+            kept.append((source, original, text))
+    return [(source, text.strip()) for source, _, text in kept]
+
+
+def summarize_turn(message: Dict[str, str], max_chars: int = 200) -> str:
+    """One extractive summary line for a conversation turn: its first sentence"""
+    content = " ".join(message["content"].split())
+    first = SENTENCE_END.split(content, maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rstrip() + "..."
+    speaker = "User" if message["role"] == "user" else "Assistant"
+    return f"{speaker}: {first}"
+
+
+def _turns_hash(turns: Sequence[Dict[str, str]]) -> str:
+    digest = hashlib.sha256()
+    for turn in turns:
+        digest.update(f"{turn['role']}\0{turn['content']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class HistoryCompactor:
+    """Rolling, per-conversation summaries of turns that no longer fit the prompt.
+
+    Summaries are cached by conversation id together with a hash of the turns
+    they cover, so each turn is summarized once as the conversation grows.
+    Without an id the turns are summarized afresh every time.
+    """
+
+    def __init__(self, max_conversations: int = 1024):
+        self.max_conversations = max_conversations
+        self._cache: "OrderedDict[str, Tuple[int, str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summarize(self, conversation_id: Optional[str], turns: Sequence[Dict[str, str]], max_tokens: int) -> str:
+        cached = None
+        if conversation_id is not None:
+            with self._lock:
+                cached = self._cache.get(conversation_id)
+        lines: List[str] = []
+        start = 0
+        if cached:
+            covered, prefix_hash, cached_lines = cached
+            if covered <= len(turns) and _turns_hash(turns[:covered]) == prefix_hash:
+                lines = list(cached_lines)
+                start = covered
+        lines.extend(summarize_turn(turn) for turn in turns[start:])
+
+        if conversation_id is not None:
+            with self._lock:
+                self._cache[conversation_id] = (len(turns), _turns_hash(turns), lines)
+                self._cache.move_to_end(conversation_id)
+                while len(self._cache) > self.max_conversations:
+                    self._cache.popitem(last=False)
+
+        # Keep the most recent lines that fit the summary budget
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            tokens = count_tokens(line) + 1
+            if used + tokens > max_tokens:
+                break
+            kept.append(line)
+            used += tokens
+        return "\n".join(reversed(kept))
+
+
+@dataclass
+class BuiltPrompt:
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    raw_tokens: int
+    context_chunks: int
+    summarized_turns: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.prompt_tokens)
+
+
+@dataclass
+class PromptStats:
+    requests: int = 0
+    prompt_tokens_total: int = 0
+    tokens_saved_total: int = 0
+    last_tokens_saved: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, prompt: BuiltPrompt):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens_total += prompt.prompt_tokens
+            self.tokens_saved_total += prompt.tokens_saved
+            self.last_tokens_saved = prompt.tokens_saved
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens_total": self.prompt_tokens_total,
+            "tokens_saved_total": self.tokens_saved_total,
+            "last_tokens_saved": self.last_tokens_saved,
+        }
+
+
+class PromptBuilder:
+    """Assembles the chat prompt within a token budget.
+
+    The system instructions, client system messages and the current question
+    are always sent. Retrieved context gets up to `context_share` of the
+    budget, recent turns fill what is left, and turns that don't fit are
+    replaced by a rolling summary of at most `summary_max_tokens`.
+    """
+
+    def __init__(self, max_prompt_tokens: int, context_share: float = 0.6, summary_max_tokens: int = 300):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.context_share = context_share
+        self.summary_max_tokens = summary_max_tokens
+        self.compactor = HistoryCompactor()
+        self.stats = PromptStats()
+
+    @staticmethod
+    def format_context(parts: Sequence[Tuple[str, str]]) -> str:
+        return "\n\n".join(f"From {source.split('/')[-1]}:\n{text}" for source, text in parts)
+
+    def build(
+        self,
+        template: str,
+        docs: Sequence["Document"],
+        messages: Sequence[Dict[str, str]],
+        conversation_id: Optional[str] = None,
+    ) -> BuiltPrompt:
+        """Build the prompt for the last user message in `messages`.
+
+        `template` is the system prompt with a `{context}` placeholder.
+        """
+        last_user = max(i for i, msg in enumerate(messages) if msg["role"] == "user")
+        question = messages[last_user]
+        history = messages[:last_user]
+        client_system = [msg for msg in history if msg["role"] == "system"]
+        turns = [msg for msg in history if msg["role"] in ("user", "assistant")]
+
+        # What the prompt would cost without budgeting, for the savings metric
+        raw_context = self.format_context(
+            [(doc.metadata.get("source", "Unknown source"), doc.page_content) for doc in docs]
+        )
+        raw_tokens = (
+            count_tokens(template.format(context=raw_context)) + MESSAGE_OVERHEAD_TOKENS
+            + sum(count_message_tokens(msg) for msg in messages)
+        )
+
+        fixed_tokens = (
+            count_tokens(template.format(context="")) + MESSAGE_OVERHEAD_TOKENS
+            + count_message_tokens(question)
+            + sum(count_message_tokens(msg) for msg in client_system)
+        )
+
+        # Retrieved context, in rank order, within its share of the budget
+        context_budget = int(self.max_prompt_tokens * self.context_share)
+        parts: List[Tuple[str, str]] = []
+        context_tokens = 0
+        for source, text in dedupe_chunks(docs):
+            tokens = count_tokens(self.format_context([(source, text)])) + 1
+            if parts and context_tokens + tokens > context_budget:
+                continue
+            parts.append((source, text))
+            context_tokens += tokens
+
+        # Recent turns, newest first, in whatever budget is left
+        remaining = self.max_prompt_tokens - fixed_tokens - context_tokens
+        turn_tokens = [count_message_tokens(turn) for turn in turns]
+        if sum(turn_tokens) <= remaining:
+            kept_from = 0
+        else:
+            remaining -= self.summary_max_tokens
+            kept_from = len(turns)
+            used = 0
+            while kept_from > 0 and used + turn_tokens[kept_from - 1] <= remaining:
+                kept_from -= 1
+                used += turn_tokens[kept_from]
+            # Don't open the kept history with a dangling assistant reply
+            while kept_from < len(turns) and turns[kept_from]["role"] == "assistant":
+                kept_from += 1
+
+        system_content = template.format(context=self.format_context(parts))
+        older = turns[:kept_from]
+        if older:
+            # Summaries are only reused within one identified conversation
+            summary = self.compactor.summarize(conversation_id, older, self.summary_max_tokens)
+            if summary:
+                system_content += f"\n\nSummary of the earlier conversation:\n{summary}"
+
+        built_messages = [{"role": "system", "content": system_content}]
+        built_messages.extend(client_system)
+        built_messages.extend(turns[kept_from:])
+        built_messages.append(question)
+
+        prompt = BuiltPrompt(
+            messages=built_messages,
+            prompt_tokens=sum(count_message_tokens(msg) for msg in built_messages),
+            raw_tokens=raw_tokens,
+            context_chunks=len(parts),
+            summarized_turns=len(older),
+        )
+        self.stats.record(prompt)
+        return prompt
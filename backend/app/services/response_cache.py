@@ -0,0 +1,210 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.services.embedding_cache import normalize_text
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    answer: str
+    vector: Optional[np.ndarray]
+    scope: Tuple[str, str]
+    created_at: float
+
+
+def conversation_key(messages: List[Dict[str, str]]) -> str:
+    """Hash of everything before the last user message.
+
+    Two requests only share cached answers when the conversation leading up to
+    the question is the same.
+    """
+    last_user = max(
+        (i for i, msg in enumerate(messages) if msg["role"] == "user"),
+        default=len(messages)
+    )
+    digest = hashlib.sha256()
+    for msg in messages[:last_user]:
+        digest.update(f"{msg['role']}\0{normalize_text(msg['content'])}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ScopeVectors:
+    """Normalized query vectors of one cache scope, as rows of a preallocated matrix.
+
+    Rows are appended in place, growing the matrix by doubling, and a removed
+    row is replaced by the last one, so lookups multiply one contiguous block.
+    """
+
+    def __init__(self, dimensions: int, capacity: int = 16):
+        self.matrix = np.empty((capacity, dimensions), dtype=np.float32)
+        self.ids: List[int] = []
+        self.rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, vector: np.ndarray):
+        if len(self.ids) == len(self.matrix):
+            grown = np.empty((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self.ids)] = self.matrix
+            self.matrix = grown
+        self.rows[entry_id] = len(self.ids)
+        self.matrix[len(self.ids)] = vector
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id: int):
+        row = self.rows.pop(entry_id)
+        last_id = self.ids.pop()
+        if last_id != entry_id:
+            self.matrix[row] = self.matrix[len(self.ids)]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+
+    def best(self, query: np.ndarray) -> Tuple[Optional[int], float]:
+        """The entry whose vector is most similar to `query`, and its cosine similarity"""
+        if not self.ids or query.shape != (self.matrix.shape[1],):
+            return None, 0.0
+        scores = self.matrix[:len(self.ids)] @ query
+        row = int(np.argmax(scores))
+        return self.ids[row], float(scores[row])
+
+
+class SemanticResponseCache:
+    """Answer cache keyed on query embedding similarity.
+
+    An answer is reused when a new query's embedding has cosine similarity of
+    at least `threshold` with a previously answered query in the same scope
+    (conversation state and document corpus version), or when its normalized
+    text is the same; keyword queries, which are never embedded, are only
+    matched on their text. Entries expire after
+    `ttl_seconds` and the least recently used are evicted above `max_entries`.
+    Lookups do a matrix product over the scope's vectors; call them off the
+    event loop.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, CachedResponse]" = OrderedDict()
+        # Entry ids in creation order, for expiry without scanning every entry
+        self._created: "deque[Tuple[float, int]]" = deque()
+        self._scopes: Dict[Tuple[str, str], ScopeVectors] = {}
+        self._by_text: Dict[Tuple[Tuple[str, str], str], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    @staticmethod
+    def text_key(query: str) -> str:
+        # "Python experience?" and "python experience" are the same question
+        return normalize_text(query).casefold().rstrip("?!. ")
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        text_key = (entry.scope, self.text_key(entry.query))
+        if self._by_text.get(text_key) == entry_id:
+            del self._by_text[text_key]
+        if entry.vector is None:
+            return
+        vectors = self._scopes[entry.scope]
+        vectors.remove(entry_id)
+        if not vectors:
+            del self._scopes[entry.scope]
+
+    def _expire(self, now: float):
+        while self._created and now - self._created[0][0] > self.ttl_seconds:
+            _, entry_id = self._created.popleft()
+            self._remove(entry_id)
+
+    def lookup(self, vector, scope: Tuple[str, str], query: Optional[str] = None) -> Optional[CachedResponse]:
+        """Return the cached answer in scope for the same `query` text, or else the
+        one most similar to `vector` if it clears the threshold. Either may be None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._expire(time.time())
+            entry_id = self._by_text.get((scope, self.text_key(query))) if query is not None else None
+            if entry_id is not None:
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return self._entries[entry_id]
+            vectors = self._scopes.get(scope)
+            if vectors is not None and vector is not None:
+                entry_id, score = vectors.best(self._normalize(vector))
+                if entry_id is not None and score >= self.threshold:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id]
+            self.misses += 1
+            return None
+
+    def store(self, query: str, vector, answer: str, scope: Tuple[str, str]):
+        """Cache an answer; without a `vector` it is only found by its exact query text"""
+        if not self.enabled:
+            return
+        entry = CachedResponse(
+            query=query,
+            answer=answer,
+            vector=self._normalize(vector) if vector is not None else None,
+            scope=scope,
+            created_at=time.time()
+        )
+        text_key = (scope, self.text_key(query))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            if text_key in self._by_text:
+                self._remove(self._by_text[text_key])
+            if entry.vector is not None:
+                vectors = self._scopes.get(scope)
+                if vectors is None or vectors.matrix.shape[1] != entry.vector.shape[0]:
+                    # A scope only ever holds vectors from one embedding model
+                    for stale_id in list(vectors.ids) if vectors is not None else []:
+                        self._remove(stale_id)
+                    vectors = self._scopes[scope] = ScopeVectors(entry.vector.shape[0])
+                vectors.add(entry_id, entry.vector)
+            self._by_text[text_key] = entry_id
+            self._entries[entry_id] = entry
+            self._created.append((entry.created_at, entry_id))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            if len(self._created) > 2 * self.max_entries:
+                # Drop the ids of entries evicted as least recently used
+                self._created = deque(item for item in self._created if item[1] in self._entries)
+
+    def purge_corpus_versions(self, keep_version: str):
+        """Drop answers generated against any other corpus version"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.scope[1] != keep_version]
+            for key in stale:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "scopes": len(self._scopes),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
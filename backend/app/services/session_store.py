@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.embedding_cache import normalize_text
+from app.services.index_store import write_atomic
+
+logger = logging.getLogger(__name__)
+
+SESSION_ROLES = ("system", "user", "assistant")
+# Retrieval results remembered per session
+SESSION_RETRIEVAL_ENTRIES = 8
+
+
+def message_digest_update(digest, message: Dict[str, str]):
+    # Same encoding as response_cache.conversation_key, so keys computed either way match
+    digest.update(f"{message['role']}\0{normalize_text(message['content'])}\n".encode("utf-8"))
+
+
+@dataclass
+class ChatSession:
+    """A conversation kept on the server, so clients send only the new message.
+
+    Besides the messages, a session caches what earlier turns already
+    computed: the running conversation hash, the LangChain form of each
+    message and recent retrieval results. Only the messages are persisted.
+    """
+    id: str
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    formatted: Dict[Tuple[str, str], Any] = field(default_factory=dict, repr=False)
+    retrievals: "OrderedDict[Tuple[str, str], List[Any]]" = field(default_factory=OrderedDict, repr=False)
+    _digest: Any = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self._rehash()
+
+    def _rehash(self):
+        self._digest = hashlib.sha256()
+        for message in self.messages:
+            message_digest_update(self._digest, message)
+
+    def history_key(self) -> str:
+        """conversation_key() of the stored messages followed by a new user message"""
+        return self._digest.hexdigest()
+
+    def append(self, *messages: Dict[str, str], max_messages: int = 0):
+        """Add messages, keeping at most `max_messages` (0 for no limit)"""
+        for message in messages:
+            self.messages.append(message)
+            message_digest_update(self._digest, message)
+        if max_messages and len(self.messages) > max_messages:
+            # Drop the oldest turns but keep client system messages
+            system = [msg for msg in self.messages if msg["role"] == "system"]
+            turns = [msg for msg in self.messages if msg["role"] != "system"]
+            self.messages = system + turns[max(0, len(turns) - (max_messages - len(system))):]
+            self.formatted.clear()
+            self._rehash()
+        self.updated_at = time.time()
+
+    def format_message(self, message: Dict[str, str], convert) -> Any:
+        """LangChain form of a session message, converted once per session"""
+        key = (message["role"], message["content"])
+        formatted = self.formatted.get(key)
+        if formatted is None:
+            formatted = self.formatted[key] = convert(message)
+        return formatted
+
+    def cached_retrieval(self, key: Tuple[str, str]) -> Optional[List[Any]]:
+        docs = self.retrievals.get(key)
+        if docs is not None:
+            self.retrievals.move_to_end(key)
+        return docs
+
+    def remember_retrieval(self, key: Tuple[str, str], docs: List[Any]):
+        self.retrievals[key] = docs
+        self.retrievals.move_to_end(key)
+        while len(self.retrievals) > SESSION_RETRIEVAL_ENTRIES:
+            self.retrievals.popitem(last=False)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "session_id": self.id,
+            "messages": self.messages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+def validate_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    checked = []
+    for message in messages:
+        if message.get("role") not in SESSION_ROLES or not isinstance(message.get("content"), str):
+            raise ValueError("Messages need a role of system, user or assistant and a string content")
+        checked.append({"role": message["role"], "content": message["content"]})
+    return checked
+
+
+class SessionStore:
+    """Chat sessions in a bounded in-memory LRU with idle expiry.
+
+    Sessions idle for more than `ttl_seconds` expire, and the least recently
+    used are evicted above `max_sessions`. With a `directory`, each session is
+    also saved there as JSON after every turn: evicted sessions are reloaded
+    on their next use, they survive restarts and every worker process using
+    the same directory sees the same sessions.
+
+    `turn_lock` serializes the turns of a session within this process.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 86400,
+        max_messages: int = 200,
+        directory: Optional[str] = None
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.directory = directory
+        self._sessions: "OrderedDict[str, Tuple[ChatSession, Optional[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._turn_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._last_sweep = time.time()
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _expired(self, session: ChatSession, now: float) -> bool:
+        return now - session.updated_at > self.ttl_seconds
+
+    def _remember(self, session: ChatSession, mtime_ns: Optional[int]):
+        with self._lock:
+            self._sessions[session.id] = (session, mtime_ns)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _mtime_ns(self, session_id: str) -> Optional[int]:
+        try:
+            return os.stat(self.path(session_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def turn_lock(self, session_id: str) -> asyncio.Lock:
+        """The lock a turn of this session holds from reading the history to saving its answer"""
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        return lock
+
+    def create(self, messages: Optional[List[Dict[str, str]]] = None) -> ChatSession:
+        session = ChatSession(secrets.token_hex(16))
+        if messages:
+            session.append(*validate_messages(messages), max_messages=self.max_messages)
+        self.save(session)
+        self.sweep()
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        if not session_id.isalnum():
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+        session, mtime_ns = entry if entry is not None else (None, None)
+
+        if self.directory:
+            # Another worker may have advanced or deleted the session
+            current_mtime = self._mtime_ns(session_id)
+            if current_mtime is None:
+                session = None
+            elif session is None or current_mtime != mtime_ns:
+                session = self._load(session_id, current_mtime)
+        if session is None:
+            self.discard(session_id)
+            return None
+        if self._expired(session, now):
+            self.delete(session_id)
+            return None
+        return session
+
+    def _load(self, session_id: str, mtime_ns: int) -> Optional[ChatSession]:
+        try:
+            with open(self.path(session_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            session = ChatSession(
+                session_id,
+                messages=validate_messages(data["messages"]),
+                created_at=data["created_at"],
+                updated_at=data["updated_at"]
+            )
+        except (FileNotFoundError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable session {session_id}: {e}")
+            return None
+        self._remember(session, mtime_ns)
+        return session
+
+    def save(self, session: ChatSession):
+        """Store a session after it changed. Blocking when a directory is configured."""
+        mtime_ns = None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self.path(session.id), json.dumps(session.to_dict()))
+            mtime_ns = self._mtime_ns(session.id)
+        self._remember(session, mtime_ns)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+        if self.directory:
+            try:
+                os.remove(self.path(session_id))
+                removed = True
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def sweep(self):
+        """Drop expired sessions, at most once per minute"""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        with self._lock:
+            expired = [sid for sid, (session, _) in self._sessions.items() if self._expired(session, now)]
+            for sid in expired:
+                del self._sessions[sid]
+        if not self.directory:
+            return
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions)}
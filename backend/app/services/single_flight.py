@@ -0,0 +1,183 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# Duplicate call suppression: concurrent callers asking for the same key share
+# one execution instead of each calling upstream.
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutine calls with the same key.
+
+    The first caller (the leader) starts the work as a task; callers that
+    arrive while it runs await the same result. The work is cancelled only
+    when every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, List[int]]] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, leader); `leader` is False when the result was shared"""
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            task = asyncio.ensure_future(factory())
+            call = (task, [0])
+            self._calls[key] = call
+
+            def finished(task: asyncio.Task):
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                # Mark a failure as retrieved even if every waiter has left
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(finished)
+        else:
+            self.coalesced += 1
+
+        task, waiters = call
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task), leader
+        except asyncio.CancelledError:
+            if not task.done() and waiters[0] == 1:
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+
+class _Broadcast:
+    """Items produced by one stream, replayed to every subscriber"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class AsyncStreamSingleFlight:
+    """Fans one in-flight async stream out to every concurrent subscriber with the same key.
+
+    Subscribers that join late first receive the items already produced, so
+    everyone gets the complete stream. The producer is cancelled when its last
+    subscriber leaves.
+    """
+
+    def __init__(self):
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.coalesced = 0
+
+    def is_leader(self, key: Hashable) -> bool:
+        """True if a subscription to `key` made now would start a new stream"""
+        return key not in self._streams
+
+    async def _produce(self, key: Hashable, broadcast: _Broadcast, stream: AsyncIterator[Any]):
+        try:
+            async for item in stream:
+                broadcast.items.append(item)
+                broadcast.notify()
+        except BaseException as e:
+            broadcast.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            broadcast.done = True
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            broadcast.notify()
+
+    async def subscribe(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, factory()))
+        else:
+            self.coalesced += 1
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(broadcast.items):
+                    yield broadcast.items[position]
+                    position += 1
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+
+
+class SingleFlight:
+    """Thread-safe single-flight for blocking calls such as embedding requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        return self.do_many([key], lambda keys: [fn()])[0]
+
+    def do_many(self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], List[Any]]) -> List[Any]:
+        """Batch form of do(): `fn` computes the keys no other thread is already computing.
+
+        Results for keys in flight elsewhere are awaited after this thread's
+        own batch is done, so two batches waiting on each other cannot deadlock.
+        """
+        owned: List[Hashable] = []
+        waiting: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+                    self.coalesced += 1
+
+        results: Dict[Hashable, Any] = {}
+        if owned:
+            try:
+                values = fn(owned)
+            except BaseException as e:
+                self._settle(owned, error=e)
+                raise
+            results.update(zip(owned, values))
+            self._settle(owned, results=results)
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return [results[key] for key in keys]
+
+    def _settle(
+        self,
+        keys: List[Hashable],
+        results: Optional[Dict[Hashable, Any]] = None,
+        error: Optional[BaseException] = None
+    ):
+        with self._lock:
+            futures = [self._calls.pop(key) for key in keys]
+        for key, future in zip(keys, futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[key])
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a token before a keep-alive comment is sent to the client
+HEARTBEAT_INTERVAL = 15.0
+
+
+def format_sse(data: Dict[str, object], event: Optional[str] = None) -> str:
+    """Encode one Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {json.dumps(data)}\n\n"
+
+
+class StreamStats:
+    """Time-to-first-token and throughput of a single token stream"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.tokens = 0
+
+    def record_token(self):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started_at) * 1000
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or self.tokens < 2:
+            return 0.0
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.first_token_at
+        # The first token marks the start of the window, so it isn't counted
+        return (self.tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        end = self.finished_at or time.perf_counter()
+        return {
+            "tokens": self.tokens,
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "tokens_per_second": round(self.tokens_per_second, 1),
+            "total_ms": round((end - self.started_at) * 1000, 1),
+        }
+
+
+async def single_token(text: str) -> AsyncIterator[str]:
+    """Token generator for an answer that is already complete, e.g. a cache hit"""
+    yield text
+
+
+async def sse_token_stream(
+    tokens: AsyncIterator[str],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+) -> AsyncIterator[str]:
+    """Relay a token generator to the client as SSE frames.
+
+    The upstream generator runs in its own task so heartbeats can be sent
+    while waiting on it, and it is cancelled as soon as the client goes away.
+    Emits one `data` frame per token, then a `done` event carrying the stream
+    stats, or an `error` event if generation fails.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+    async def produce():
+        try:
+            async for token in tokens:
+                await queue.put(("token", token))
+            await queue.put(("done", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in streaming response: {e}")
+            await queue.put(("error", str(e)))
+        finally:
+            aclose = getattr(tokens, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    stats = StreamStats()
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    logger.info("Client disconnected, cancelling generation")
+                    break
+                yield ": heartbeat\n\n"
+                continue
+
+            if kind == "token":
+                stats.record_token()
+                yield format_sse({"token": value})
+            elif kind == "error":
+                yield format_sse({"error": value}, event="error")
+                break
+            else:
+                stats.finish()
+                logger.info(f"Stream finished: {stats.to_dict()}")
+                yield format_sse(stats.to_dict(), event="done")
+                break
+    finally:
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
@@ -0,0 +1,116 @@
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.services.metrics import REQUEST_DURATION, STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than SLOW_REQUEST_MS are logged with their stage breakdown;
+# SLOW_REQUEST_SAMPLE_RATE is the share of those that are actually written.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "0.1"))
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+@dataclass
+class RequestTrace:
+    """Per-request record of stage timings and attributes (token counts, sources)"""
+    endpoint: str
+    outcome: str = "miss"
+    started_at: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    finished: bool = False
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "outcome": self.outcome,
+            "total_ms": round(self.elapsed_ms, 1),
+            "stages_ms": {stage: round(ms, 1) for stage, ms in self.stages.items()},
+            **self.attributes,
+        }
+
+    def finish(self):
+        """Record the request latency and log it if slow; later calls are no-ops"""
+        if self.finished:
+            return
+        self.finished = True
+        elapsed_ms = self.elapsed_ms
+        REQUEST_DURATION.observe(elapsed_ms / 1000, endpoint=self.endpoint, outcome=self.outcome)
+        if elapsed_ms >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+            logger.warning(f"Slow request: {self.to_dict()}")
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def activate_trace(trace: RequestTrace):
+    """Make `trace` the current trace for spans recorded in this context"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # An async generator finalized from another task; its context is gone anyway
+            pass
+
+
+@contextmanager
+def request_trace(endpoint: str):
+    """Trace one request end to end"""
+    trace = RequestTrace(endpoint)
+    with activate_trace(trace):
+        try:
+            yield trace
+        finally:
+            trace.finish()
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_DURATION.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into its histogram and the current request trace"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at)
+
+
+def set_outcome(outcome: str):
+    """Set the outcome label of the current request trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+
+def annotate(**attributes):
+    """Attach attributes to the current request trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
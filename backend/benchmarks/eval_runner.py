@@ -0,0 +1,157 @@
+"""Offline evaluation runner for the batch question-answering endpoint.
+
+Sends a fixed list of questions to /api/chat/batch of a running server and
+writes one JSON line per question with its answer, retrieved sources, stage
+timings and check results, then prints a summary. Run it after updating the
+documents to catch regressions in answer quality and latency.
+
+The questions file is either plain text, one question per line (blank lines
+and lines starting with # are skipped), or JSONL with one object per line:
+
+    {"id": "aws-1", "question": "Has Jason used AWS?", "expect": ["AWS"], "expect_sources": ["resume.txt"]}
+
+`expect` lists phrases the answer must contain (case-insensitive) and
+`expect_sources` files that must be among the retrieved sources; both are
+optional.
+
+Run from the backend directory:
+
+    python -m benchmarks.eval_runner questions.txt --output results.jsonl
+    python -m benchmarks.eval_runner questions.jsonl --no-cache --strict   # exit 1 on failures
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load_test import percentile, wait_until_ready
+
+
+def load_questions(path: str) -> List[Dict[str, object]]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if line.startswith("{") else {"question": line}
+            # The endpoint takes string ids; results are matched back by them
+            item["id"] = str(item.get("id", number))
+            questions.append(item)
+    return questions
+
+
+def check_result(item: Dict[str, object], result: Dict[str, object]) -> Dict[str, object]:
+    answer = (result.get("answer") or "").lower()
+    missing = [phrase for phrase in item.get("expect", []) if phrase.lower() not in answer]
+    missing_sources = [source for source in item.get("expect_sources", []) if source not in result.get("sources", [])]
+    return {
+        "passed": not result.get("error") and not missing and not missing_sources,
+        "missing": missing,
+        "missing_sources": missing_sources,
+    }
+
+
+async def run_batch(
+    client: httpx.AsyncClient,
+    items: List[Dict[str, object]],
+    use_cache: bool,
+    output
+) -> List[Dict[str, object]]:
+    payload = {
+        "questions": [{"id": item["id"], "question": item["question"]} for item in items],
+        "use_cache": use_cache,
+    }
+    by_id = {item["id"]: item for item in items}
+    results = []
+    async with client.stream("POST", "/api/chat/batch", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["type"] == "error":
+                raise RuntimeError(f"Batch failed: {record['error']}")
+            if record["type"] == "result":
+                item = by_id[record["id"]]
+                if "expect" in item or "expect_sources" in item:
+                    record["check"] = check_result(item, record)
+                results.append(record)
+            if output is not None:
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+    return results
+
+
+async def main_async(args) -> Dict[str, object]:
+    questions = load_questions(args.questions)
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        async with httpx.AsyncClient(base_url=args.url, timeout=httpx.Timeout(args.timeout)) as client:
+            await wait_until_ready(client, args.startup_timeout)
+            start = time.perf_counter()
+            results = []
+            for offset in range(0, len(questions), args.batch_size):
+                batch = questions[offset:offset + args.batch_size]
+                results.extend(await run_batch(client, batch, not args.no_cache, output))
+                print(f"{len(results)}/{len(questions)} questions answered", file=sys.stderr)
+            elapsed = time.perf_counter() - start
+    finally:
+        if output is not None:
+            output.close()
+
+    outcomes: Dict[str, int] = {}
+    for result in results:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+    checked = [result for result in results if "check" in result]
+    latencies = [result["total_ms"] for result in results if not result.get("error")]
+    return {
+        "questions": len(questions),
+        "errors": sum(1 for result in results if result.get("error")),
+        "outcomes": outcomes,
+        "checks_passed": sum(1 for result in checked if result["check"]["passed"]),
+        "checks_failed": sum(1 for result in checked if not result["check"]["passed"]),
+        "failed_ids": [result["id"] for result in checked if not result["check"]["passed"]],
+        "wall_time_s": round(elapsed, 2),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="Questions file: plain text, one per line, or JSONL")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server to evaluate")
+    parser.add_argument("--output", help="Write one JSON line per question (and per batch summary) to this file")
+    parser.add_argument("--batch-size", type=int, default=200,
+                        help="Questions per request; at most the server's BATCH_MAX_QUESTIONS")
+    parser.add_argument("--no-cache", action="store_true", help="Generate every answer instead of using cached ones")
+    parser.add_argument("--timeout", type=float, default=1800, help="Per-batch timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 on errors or failed checks")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if the p95 latency exceeds this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    summary = asyncio.run(main_async(args))
+    print(json.dumps(summary, indent=2))
+
+    failed = False
+    if args.strict and (summary["errors"] or summary["checks_failed"]):
+        failed = True
+    if args.max_p95_ms is not None and summary["p95_ms"] is not None and summary["p95_ms"] > args.max_p95_ms:
+        failed = True
+    if failed:
+        print("Regression detected", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""Load-test benchmark for the chat API.
+
+Drives /api/chat, /api/chat/stream and /api/reload-documents at a configurable
+concurrency and reports p50/p95/p99 latency, throughput and (for streaming)
+time-to-first-token. Reload latency is the time until the reindex job has
+swapped in the new index.
+
+By default it starts the API in a subprocess with the deterministic "fake"
+LLM and embedding backends over a synthetic corpus, so it runs offline and
+in CI. Pass --url to benchmark an already running server instead.
+
+Each endpoint gets its own questions and none repeats, and the local server
+runs with the response cache off, so the numbers measure retrieval and
+generation rather than cache lookups. --unique-questions and
+--response-cache opt into repeated questions and the cache.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+    python -m benchmarks.load_test --endpoints stream --corpus-docs 500 --json results.json
+    python -m benchmarks.load_test --max-p95-ms 1500   # exit 1 on regression
+    python -m benchmarks.load_test --endpoints chat --reload-during-load --reloads 5
+    python -m benchmarks.load_test --workers 4   # multi-process scaling
+    python -m benchmarks.load_test --response-cache --unique-questions 50   # with cache hits
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TECHNOLOGIES = [
+    "Python", "FastAPI", "Django", "Flask", "React", "Next.js", "TypeScript", "Docker",
+    "Kubernetes", "NGINX", "PostgreSQL", "Redis", "Kafka", "PyTorch", "TensorFlow",
+    "LangChain", "Terraform", "AWS", "GCP", "Azure", "CUDA", "Grafana", "Prometheus",
+    "GraphQL", "Rust", "Go", "Spark", "Airflow", "Elasticsearch", "MongoDB",
+]
+
+FILLER = (
+    "designed built shipped maintained scaled optimized migrated led mentored "
+    "production services pipelines platform infrastructure team customers latency "
+    "throughput reliability monitoring deployment architecture models inference "
+    "training data backend frontend cloud cluster api integration testing"
+).split()
+
+QUESTION_TEMPLATES = [
+    "What experience does Jason have with {tech}?",
+    "Has Jason used {tech} in production?",
+    "How did Jason use {tech} at work?",
+    "Tell me about Jason's {tech} projects.",
+    "{tech}",
+]
+
+
+def write_corpus(docs_dir: str, docs: int, words_per_doc: int, seed: int):
+    """Write a deterministic synthetic resume corpus"""
+    rng = random.Random(seed)
+    os.makedirs(docs_dir, exist_ok=True)
+    for i in range(docs):
+        paragraphs = []
+        for _ in range(max(1, words_per_doc // 60)):
+            words = [rng.choice(TECHNOLOGIES) if rng.random() < 0.15 else rng.choice(FILLER) for _ in range(60)]
+            paragraphs.append("Jason " + " ".join(words) + ".")
+        with open(os.path.join(docs_dir, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def make_questions(count: int, seed: int) -> List[str]:
+    """`count` distinct questions; past the template combinations they get a variant suffix"""
+    rng = random.Random(seed)
+    combos = [t.format(tech=tech) for t in QUESTION_TEMPLATES for tech in TECHNOLOGIES]
+    rng.shuffle(combos)
+    return [
+        combos[i % len(combos)] + (f" (variant {i // len(combos)})" if i >= len(combos) else "")
+        for i in range(count)
+    ]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class EndpointStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.cache_hits = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, status: str, latency: Optional[float], ttft: Optional[float] = None, cache_hit: bool = False):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if latency is None:
+            self.errors += 1
+            return
+        self.latencies.append(latency)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+        if cache_hit:
+            self.cache_hits += 1
+
+    def summary(self) -> Dict[str, object]:
+        elapsed = self.finished - self.started
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        result = {
+            "endpoint": self.name,
+            "requests": sum(self.statuses.values()),
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "cache_hits": self.cache_hits,
+            "throughput_rps": round(len(self.latencies) / elapsed, 2) if elapsed > 0 else None,
+            "p50_ms": ms(percentile(self.latencies, 50)),
+            "p95_ms": ms(percentile(self.latencies, 95)),
+            "p99_ms": ms(percentile(self.latencies, 99)),
+        }
+        if self.ttfts:
+            result.update({
+                "ttft_p50_ms": ms(percentile(self.ttfts, 50)),
+                "ttft_p95_ms": ms(percentile(self.ttfts, 95)),
+                "ttft_p99_ms": ms(percentile(self.ttfts, 99)),
+            })
+        return result
+
+
+async def chat_once(client: httpx.AsyncClient, question: str, stats: EndpointStats):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/api/chat", json={"messages": [{"role": "user", "content": question}]})
+    except httpx.HTTPError as e:
+        stats.record(type(e).__name__, None)
+        return
+    latency = time.perf_counter() - start
+    ok = response.status_code == 200
+    stats.record(str(response.status_code), latency if ok else None, cache_hit=response.headers.get("x-cache") == "HIT")
+
+
+async def stream_once(client: httpx.AsyncClient, question: str, stats: EndpointStats):
+    start = time.perf_counter()
+    ttft = None
+    status = "incomplete"
+    try:
+        async with client.stream(
+            "POST", "/api/chat/stream", json={"messages": [{"role": "user", "content": question}]}
+        ) as response:
+            if response.status_code != 200:
+                stats.record(str(response.status_code), None)
+                return
+            cache_hit = response.headers.get("x-cache") == "HIT"
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line.split(":", 1)[1].strip()
+                elif line.startswith("data:"):
+                    if event is None and ttft is None:
+                        ttft = time.perf_counter() - start
+                    if event in ("done", "error"):
+                        status = "200" if event == "done" else "stream_error"
+                        break
+                elif not line:
+                    event = None
+    except httpx.HTTPError as e:
+        stats.record(type(e).__name__, None)
+        return
+    latency = time.perf_counter() - start
+    stats.record(status, latency if status == "200" else None, ttft=ttft, cache_hit=cache_hit)
+
+
+async def reload_once(client: httpx.AsyncClient, stats: EndpointStats):
+    """Start a reload job and poll it; latency is the time until the new index is live"""
+    start = time.perf_counter()
+    try:
+        response = await client.post("/api/reload-documents")
+        if response.status_code != 202:
+            stats.record(str(response.status_code), None)
+            return
+        status_url = response.json()["status_url"]
+        while True:
+            job = (await client.get(status_url)).json()
+            if job["state"] in ("succeeded", "failed"):
+                break
+            await asyncio.sleep(0.05)
+    except httpx.HTTPError as e:
+        stats.record(type(e).__name__, None)
+        return
+    latency = time.perf_counter() - start
+    stats.record(job["state"], latency if job["state"] == "succeeded" else None)
+
+
+async def run_load(client: httpx.AsyncClient, name: str, requests: int, concurrency: int, questions: List[str]) -> EndpointStats:
+    stats = EndpointStats(name)
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(questions[i % len(questions)])
+
+    async def worker():
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if name == "chat":
+                await chat_once(client, question, stats)
+            else:
+                await stream_once(client, question, stats)
+
+    stats.started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.finished = time.perf_counter()
+    return stats
+
+
+async def run_reloads(client: httpx.AsyncClient, count: int, docs_dir: Optional[str]) -> EndpointStats:
+    """Sequential reloads; with a local corpus one document is edited before each"""
+    stats = EndpointStats("reload")
+    stats.started = time.perf_counter()
+    for i in range(count):
+        if docs_dir:
+            with open(os.path.join(docs_dir, "doc_00000.txt"), "a", encoding="utf-8") as f:
+                f.write(f"\n\nJason benchmark edit {i}.")
+        await reload_once(client, stats)
+    stats.finished = time.perf_counter()
+    return stats
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/api/ready")
+            if response.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server was not ready after {timeout:.0f}s")
+
+
+def start_local_server(args, workdir: str) -> Tuple[List[subprocess.Popen], str]:
+    """Start the API with fake backends over a fresh synthetic corpus.
+
+    With --workers > 1 this is the multi-process layout: one index builder
+    process and uvicorn workers that open the index read-only.
+    """
+    docs_dir = os.path.join(workdir, "documents")
+    write_corpus(docs_dir, args.corpus_docs, args.doc_words, args.seed)
+    port = free_port()
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake",
+        EMBEDDING_BACKEND="fake",
+        FAKE_LLM_LATENCY_MS=str(args.fake_latency_ms),
+        FAKE_LLM_TOKENS_PER_SECOND=str(args.fake_tokens_per_second),
+        DOCS_DIR=docs_dir,
+        CHROMA_DIR=os.path.join(workdir, "chroma"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.sqlite3"),
+        IMAGE_CACHE_DIR=os.path.join(workdir, "image_cache"),
+    )
+    if not args.response_cache:
+        env["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+    processes = []
+    if args.workers > 1:
+        processes.append(subprocess.Popen([sys.executable, "-m", "app.index_builder"], cwd=BACKEND_DIR, env=env))
+        env["INDEX_ROLE"] = "reader"
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--workers", str(args.workers)],
+        cwd=BACKEND_DIR,
+        env=env,
+    ))
+    return processes, f"http://127.0.0.1:{port}"
+
+
+async def main_async(args) -> List[Dict[str, object]]:
+    processes: List[subprocess.Popen] = []
+    docs_dir = None
+    workdir = tempfile.TemporaryDirectory(prefix="hemwick-bench-")
+    try:
+        if args.url:
+            base_url = args.url
+        else:
+            processes, base_url = start_local_server(args, workdir.name)
+            docs_dir = os.path.join(workdir.name, "documents")
+
+        limits = httpx.Limits(max_connections=args.concurrency + 4)
+        timeout = httpx.Timeout(args.timeout)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+            start = time.perf_counter()
+            await wait_until_ready(client, args.startup_timeout)
+            print(f"Server ready in {time.perf_counter() - start:.2f}s at {base_url}", file=sys.stderr)
+
+            # Separate question sets, so one endpoint never replays answers cached by another
+            endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",")]
+            per_endpoint = args.unique_questions or args.requests
+            questions = make_questions(per_endpoint * len(endpoints), args.seed)
+            results = []
+            # With --reload-during-load the reloads run alongside the chat/stream load
+            reloads = None
+            if args.reload_during_load:
+                reloads = asyncio.create_task(run_reloads(client, args.reloads, docs_dir))
+            for number, endpoint in enumerate(endpoints):
+                if endpoint in ("chat", "stream"):
+                    endpoint_questions = questions[number * per_endpoint:(number + 1) * per_endpoint]
+                    stats = await run_load(client, endpoint, args.requests, args.concurrency, endpoint_questions)
+                elif endpoint == "reload":
+                    if reloads is not None:
+                        continue
+                    stats = await run_reloads(client, args.reloads, docs_dir)
+                else:
+                    raise SystemExit(f"Unknown endpoint {endpoint!r}")
+                results.append(stats.summary())
+            if reloads is not None:
+                results.append((await reloads).summary())
+            return results
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        workdir.cleanup()
+
+
+def print_table(results: List[Dict[str, object]]):
+    columns = ["endpoint", "requests", "errors", "cache_hits", "throughput_rps", "p50_ms", "p95_ms",
+               "p99_ms", "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms"]
+    rows = [[str(result.get(column, "-")) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one with fake backends")
+    parser.add_argument("--endpoints", default="chat,stream,reload", help="Comma-separated: chat, stream, reload")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per chat/stream endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--reloads", type=int, default=3, help="Sequential /api/reload-documents calls")
+    parser.add_argument("--reload-during-load", action="store_true",
+                        help="Run the reloads concurrently with the chat/stream load")
+    parser.add_argument("--unique-questions", type=int,
+                        help="Distinct questions per endpoint, cycled through; default one per request (no repeats)")
+    parser.add_argument("--corpus-docs", type=int, default=50, help="Synthetic documents to generate")
+    parser.add_argument("--doc-words", type=int, default=600, help="Approximate words per synthetic document")
+    parser.add_argument("--fake-latency-ms", type=float, default=200)
+    parser.add_argument("--fake-tokens-per-second", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Server worker processes; above 1 also starts the index builder process")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Keep the semantic response cache of the local server on (off by default)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if any endpoint's p95 exceeds this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(main_async(args))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [r for r in results if r["errors"]]
+    if args.max_p95_ms is not None:
+        failed += [r for r in results if r["p95_ms"] is not None and r["p95_ms"] > args.max_p95_ms]
+    if failed:
+        print(f"Regression: {', '.join(sorted({r['endpoint'] for r in failed}))}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
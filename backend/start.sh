@@ -0,0 +1,49 @@
+#!/bin/sh
+# Container entrypoint.
+#
+# WEB_CONCURRENCY=1 (default): a single process builds, writes and serves the index.
+# WEB_CONCURRENCY>1: one builder process owns all index writes and the uvicorn
+# workers open the published index versions read-only (INDEX_ROLE=reader).
+# The builder is restarted whenever it exits, and both are stopped together.
+set -e
+
+WORKERS="${WEB_CONCURRENCY:-1}"
+PORT="${PORT:-8000}"
+BUILDER_RESTART_DELAY="${BUILDER_RESTART_DELAY:-5}"
+
+if [ "$WORKERS" -le 1 ]; then
+    exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --workers "$WORKERS"
+fi
+
+# Workers share chat sessions through the filesystem
+export SESSION_DIR="${SESSION_DIR:-app/data/sessions}"
+
+supervise_builder() {
+    builder=""
+    trap 'if [ -n "$builder" ]; then kill -TERM "$builder" 2>/dev/null; wait "$builder"; fi; exit 0' TERM INT
+    while :; do
+        python -m app.index_builder &
+        builder=$!
+        status=0
+        wait "$builder" || status=$?
+        builder=""
+        echo "Index builder exited with status $status; restarting in ${BUILDER_RESTART_DELAY}s" >&2
+        sleep "$BUILDER_RESTART_DELAY" &
+        wait $! || true
+    done
+}
+
+supervise_builder &
+supervisor=$!
+
+INDEX_ROLE=reader uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --workers "$WORKERS" &
+server=$!
+
+# Forward shutdown signals; if the server exits on its own, stop the builder too
+trap 'kill -TERM "$server" "$supervisor" 2>/dev/null' TERM INT
+status=0
+wait "$server" || status=$?
+kill -TERM "$supervisor" 2>/dev/null || true
+wait "$server" 2>/dev/null || true
+wait "$supervisor" 2>/dev/null || true
+exit "$status"
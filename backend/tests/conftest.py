@@ -0,0 +1,70 @@
+"""Point the app at the fake backends and a scratch data directory.
+
+The service reads its configuration when it is imported, so this runs before
+any test module imports it. No test needs network access or API keys.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="chatbot-tests-")
+
+os.environ.update({
+    "LLM_BACKEND": "fake",
+    "EMBEDDING_BACKEND": "fake",
+    "FAKE_LLM_LATENCY_MS": "0",
+    "FAKE_LLM_TOKENS_PER_SECOND": "0",
+    "FAKE_EMBEDDING_DIMENSIONS": "64",
+    "DOCS_DIR": os.path.join(DATA_DIR, "documents"),
+    "CHROMA_DIR": os.path.join(DATA_DIR, "chroma"),
+    "EMBEDDING_CACHE_PATH": os.path.join(DATA_DIR, "embedding_cache.sqlite3"),
+    "IMAGE_CACHE_DIR": os.path.join(DATA_DIR, "image_cache"),
+    "IMAGE_PREGENERATE": "false",
+})
+
+RESUME = """Jason Lee - Software Engineer III
+
+Jason builds backend services in Python with FastAPI and deploys them with Docker and NGINX.
+
+He led an in-house LLM platform: fine-tuning pipelines and model hosting on multi-GPU clusters.
+
+On the frontend he builds React and Next.js dashboards for real-time monitoring.
+"""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def data_dir():
+    os.makedirs(os.environ["DOCS_DIR"], exist_ok=True)
+    with open(os.path.join(os.environ["DOCS_DIR"], "resume.txt"), "w", encoding="utf-8") as f:
+        f.write(RESUME)
+    yield DATA_DIR
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def llm_service():
+    """A warmed-up service over the fake backends; the index is built by the first test using it"""
+    from app.services.llm_service import LLMService
+
+    service = LLMService()
+    service.warm_up()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def api_client():
+    """The FastAPI app over the fake backends, once it reports ready"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 30
+        while client.get("/api/ready").status_code != 200:
+            assert time.monotonic() < deadline, "service did not become ready"
+            time.sleep(0.05)
+        yield client
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from app.services.concurrency import ConcurrencyLimiter
+from app.services.mock_llm_service import mock_response_text
+
+
+def run_batch(service, questions, **kwargs):
+    async def collect():
+        return [record async for record in service.answer_batch(questions, **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_every_question_is_answered_and_a_summary_comes_last(llm_service):
+    questions = ["What Python experience does Jason have?", "Has he used Docker?", "What Python experience does Jason have?"]
+
+    records = run_batch(llm_service, questions, use_cache=False)
+
+    results, summary = records[:-1], records[-1]
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    for result in results:
+        assert result["error"] is None
+        assert result["answer"] == mock_response_text([{"role": "user", "content": result["question"]}])
+        assert result["sources"] == ["resume.txt"]
+    assert summary["type"] == "summary"
+    assert summary["questions"] == 3
+    assert summary["corpus_version"] == llm_service.corpus_version
+    assert sum(summary["outcomes"].values()) == 3
+
+
+def test_cached_answers_are_reused_unless_disabled(llm_service):
+    questions = ["Which frontend frameworks does Jason use?", "Tell me about his LLM platform"]
+    run_batch(llm_service, questions)
+
+    cached = run_batch(llm_service, questions)
+    fresh = run_batch(llm_service, questions, use_cache=False)
+
+    assert cached[-1]["outcomes"] == {"hit": 2}
+    assert "hit" not in fresh[-1]["outcomes"]
+
+
+def test_batch_waits_for_llm_slots_instead_of_failing(llm_service):
+    # One LLM slot and no queue: interactive requests would get 429 here
+    llm_service.limiter = ConcurrencyLimiter(1, 0)
+    questions = [f"What did Jason build in project {number}?" for number in range(6)]
+
+    records = run_batch(llm_service, questions, use_cache=False, concurrency=4)
+
+    assert [result["error"] for result in records[:-1]] == [None] * 6
+
+
+def test_batch_retrieval_does_not_block_the_event_loop(llm_service, monkeypatch):
+    fuse_rankings = llm_service.fuse_rankings
+
+    def slow_fuse_rankings(*args):
+        time.sleep(0.05)
+        return fuse_rankings(*args)
+
+    monkeypatch.setattr(llm_service, "fuse_rankings", slow_fuse_rankings)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        await llm_service.retrieve_many([f"Python question {number}" for number in range(4)])
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.services.concurrency import ConcurrencyLimiter, ServiceBusyError
+
+
+async def hold(limiter, release, always_wait=False):
+    async with limiter.slot(always_wait=always_wait):
+        await release.wait()
+
+
+def test_callers_beyond_the_queue_are_rejected():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(limiter, release))
+        queued = asyncio.create_task(hold(limiter, release))
+        await asyncio.sleep(0)
+        assert (limiter.active, limiter.waiting, limiter.saturated) == (1, 1, True)
+
+        with pytest.raises(ServiceBusyError):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert (limiter.active, limiter.waiting, limiter.saturated) == (0, 0, False)
+
+    asyncio.run(scenario())
+
+
+def test_always_wait_queues_past_the_limit():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=0)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(limiter, release))
+        await asyncio.sleep(0)
+        assert limiter.saturated
+
+        batch = asyncio.create_task(hold(limiter, release, always_wait=True))
+        await asyncio.sleep(0)
+        assert (limiter.active, limiter.waiting) == (1, 1)
+
+        release.set()
+        await asyncio.gather(running, batch)
+        assert (limiter.active, limiter.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_saturated_service_answers_429(api_client, monkeypatch):
+    service = api_client.app.state.llm_service
+    monkeypatch.setattr(service, "limiter", ConcurrencyLimiter(max_concurrent=0, max_waiting=0))
+
+    response = api_client.post("/api/chat", json={"messages": [
+        {"role": "user", "content": "Which load balancer did Jason configure?"}
+    ]})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
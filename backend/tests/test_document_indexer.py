@@ -0,0 +1,145 @@
+import pytest
+
+from app.services.document_indexer import DocumentIndexer
+
+
+class FakeEmbeddings:
+    def __init__(self, dimensions=4):
+        self.dimensions = dimensions
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] * self.dimensions for text in texts]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for chunk_id, vector, text, metadata in zip(ids, embeddings, documents, metadatas):
+            self.rows[chunk_id] = (vector, text, metadata)
+
+    def count(self):
+        return len(self.rows)
+
+
+class FakeVectorStore:
+    """The parts of langchain_chroma.Chroma that DocumentIndexer.sync uses"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self._collection = FakeCollection()
+
+    def get(self, include=None):
+        return {"ids": list(self._collection.rows)}
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self._collection.rows.pop(chunk_id, None)
+
+    def reset_collection(self):
+        self._collection = FakeCollection()
+
+    def texts(self):
+        return sorted(text for _, text, _ in self._collection.rows.values())
+
+
+def paragraph(word):
+    # About 300 characters: two never fit one chunk, so each is a chunk of its own
+    return " ".join([word] * (300 // (len(word) + 1)))
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    path = tmp_path / "docs"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def indexer(docs_dir, tmp_path):
+    return DocumentIndexer(str(docs_dir), str(tmp_path / "index"), embed_batch_size=2, embedding_model="fake-a")
+
+
+def write_doc(docs_dir, name, *words):
+    (docs_dir / name).write_text("\n\n".join(paragraph(word) for word in words), encoding="utf-8")
+
+
+def test_first_sync_embeds_every_chunk(docs_dir, indexer):
+    write_doc(docs_dir, "resume.txt", "python", "aws", "kubernetes")
+    write_doc(docs_dir, "notes.txt", "hiking")
+    store = FakeVectorStore(FakeEmbeddings())
+
+    result = indexer.sync(store)
+
+    assert (result.added, result.updated, result.removed, result.unchanged) == (2, 0, 0, 0)
+    assert result.chunks_embedded == 4
+    assert store._collection.count() == 4
+    assert not indexer.needs_sync()
+
+
+def test_unchanged_corpus_embeds_nothing(docs_dir, indexer):
+    write_doc(docs_dir, "resume.txt", "python", "aws")
+    store = FakeVectorStore(FakeEmbeddings())
+    first = indexer.sync(store)
+    store.embeddings.calls.clear()
+
+    second = indexer.sync(store)
+
+    assert second.unchanged == 1
+    assert second.chunks_embedded == second.chunks_deleted == 0
+    assert store.embeddings.calls == []
+    assert second.corpus_version == first.corpus_version
+
+
+def test_changed_file_embeds_only_its_new_chunks(docs_dir, indexer):
+    write_doc(docs_dir, "resume.txt", "python", "aws", "kubernetes")
+    write_doc(docs_dir, "notes.txt", "hiking")
+    store = FakeVectorStore(FakeEmbeddings())
+    first = indexer.sync(store)
+    store.embeddings.calls.clear()
+
+    write_doc(docs_dir, "resume.txt", "python", "azure", "kubernetes")
+    assert indexer.needs_sync()
+    result = indexer.sync(store)
+
+    assert (result.added, result.updated, result.removed, result.unchanged) == (0, 1, 0, 1)
+    assert result.chunks_embedded == 1
+    assert result.chunks_deleted == 1
+    assert store.embeddings.calls == [[paragraph("azure")]]
+    assert paragraph("aws") not in store.texts()
+    assert store._collection.count() == 4
+    assert result.corpus_version != first.corpus_version
+
+
+def test_deleted_file_removes_its_chunks(docs_dir, indexer):
+    write_doc(docs_dir, "resume.txt", "python")
+    write_doc(docs_dir, "notes.txt", "hiking", "climbing")
+    store = FakeVectorStore(FakeEmbeddings())
+    indexer.sync(store)
+
+    (docs_dir / "notes.txt").unlink()
+    result = indexer.sync(store)
+
+    assert (result.removed, result.unchanged) == (1, 1)
+    assert result.chunks_deleted == 2
+    assert store.texts() == [paragraph("python")]
+    assert list(indexer.load_manifest()["files"]) == ["resume.txt"]
+
+
+def test_embedding_model_change_re_embeds_everything(docs_dir, indexer, tmp_path):
+    write_doc(docs_dir, "resume.txt", "python", "aws")
+    store = FakeVectorStore(FakeEmbeddings(dimensions=4))
+    first = indexer.sync(store)
+
+    switched = DocumentIndexer(str(docs_dir), indexer.index_dir, embedding_model="fake-b")
+    assert switched.needs_sync()
+    store.embeddings = FakeEmbeddings(dimensions=8)
+    result = switched.sync(store)
+
+    assert result.added == 1
+    assert result.chunks_embedded == 2
+    assert {len(vector) for vector, _, _ in store._collection.rows.values()} == {8}
+    assert result.corpus_version != first.corpus_version
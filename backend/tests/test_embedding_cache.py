@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.mock_llm_service import HashingEmbeddings
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(dimensions=16)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return super().embed_query(text)
+
+
+def test_repeated_texts_are_embedded_once(tmp_path):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, EmbeddingCache(str(tmp_path / "cache.sqlite3")))
+
+    first = embeddings.embed_documents(["Python", "Docker", "Python"])
+    assert underlying.embedded == ["Python", "Docker"]
+    # Keys use normalized text, and queries share the cache with documents
+    assert embeddings.embed_query("  Docker ") == first[1]
+    assert embeddings.embed_documents(["Docker", "React"])[0] == first[1]
+    assert underlying.embedded == ["Python", "Docker", "React"]
+    assert np.allclose(first[0], HashingEmbeddings(16).embed_query("Python"), atol=1e-6)
+    assert embeddings.cache.stats()["hits"] == 2
+
+
+def test_vectors_persist_and_are_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddings(CountingEmbeddings(), EmbeddingCache(path)).embed_query("Kubernetes")
+
+    underlying = CountingEmbeddings()
+    CachedEmbeddings(underlying, EmbeddingCache(path)).embed_query("Kubernetes")
+    assert underlying.embedded == []
+    CachedEmbeddings(underlying, EmbeddingCache(path), model="other-model").embed_query("Kubernetes")
+    assert underlying.embedded == ["Kubernetes"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2, touch_interval=0)
+    cache.put_many({"a": [1.0], "b": [2.0]})
+    time.sleep(0.01)
+    cache.get_many(["a"])
+
+    cache.put_many({"c": [3.0]})
+
+    assert sorted(cache.get_many(["a", "b", "c"])) == ["a", "c"]
+    assert cache.stats()["entries"] == 2
+
+
+def test_the_bound_holds_across_processes_sharing_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = EmbeddingCache(path, max_entries=3), EmbeddingCache(path, max_entries=3)
+
+    first.put_many({"a": [1.0], "b": [2.0]})
+    second.put_many({"c": [3.0], "d": [4.0]})
+
+    assert len(first.get_many(["a", "b", "c", "d"])) == 3
+    assert second.stats()["entries"] == 3
@@ -0,0 +1,55 @@
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from app.services.exact_index import ExactVectorIndex
+from app.services.mock_llm_service import HashingEmbeddings
+
+TEXTS = [f"Jason worked on project {name}" for name in ("apollo", "gemini", "mercury", "skylab", "voyager")]
+
+
+def test_search_ranks_by_cosine_similarity():
+    docs = [Document(page_content=text) for text in ("a", "b", "c")]
+    index = ExactVectorIndex.from_vectors(docs, [[1.0, 0.0], [0.6, 0.8], [0.0, 2.0]])
+
+    hits = index.similarity_search_with_score_by_vector([0.0, 1.0], k=2)
+
+    assert [doc.page_content for doc, _ in hits] == ["c", "b"]
+    assert np.isclose(hits[0][1], 1.0) and np.isclose(hits[1][1], 0.8)
+    assert [[d.page_content for d in row] for row in index.similarity_search_by_vectors([[1, 0], [0, 1]], k=1)] == [
+        ["a"], ["c"]
+    ]
+
+
+def test_export_pages_through_the_collection(tmp_path):
+    embeddings = HashingEmbeddings(dimensions=16)
+    chroma = Chroma(persist_directory=str(tmp_path / "chroma"), embedding_function=embeddings)
+    chroma.add_texts(TEXTS, metadatas=[{"source": "resume.txt"}] * len(TEXTS))
+
+    index = ExactVectorIndex.from_vectorstore(chroma, embeddings, page_size=2)
+
+    assert sorted(doc.page_content for doc in index.docs) == sorted(TEXTS)
+    assert index.matrix.shape == (5, 16) and index.matrix.dtype == np.float32
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+    assert index.similarity_search("Jason worked on project skylab", k=1)[0].page_content == TEXTS[3]
+
+
+def test_export_of_an_empty_collection(tmp_path):
+    chroma = Chroma(persist_directory=str(tmp_path / "chroma"), embedding_function=HashingEmbeddings(dimensions=16))
+
+    index = ExactVectorIndex.from_vectorstore(chroma)
+
+    assert len(index) == 0
+    assert index.similarity_search_by_vector([1.0] * 16, k=3) == []
+
+
+def test_saved_index_is_memory_mapped_for_its_corpus_version_only(tmp_path):
+    docs = [Document(page_content=text, metadata={"source": "resume.txt"}) for text in TEXTS]
+    index = ExactVectorIndex.from_vectors(docs, np.eye(5, dtype=np.float32))
+    index.save(str(tmp_path), "corpus-1")
+
+    loaded = ExactVectorIndex.load(str(tmp_path), "corpus-1")
+
+    assert loaded.stats() == {"chunks": 5, "dimensions": 5, "memory_mapped": True}
+    assert loaded.similarity_search_by_vector([0, 0, 1, 0, 0], k=1)[0].page_content == TEXTS[2]
+    assert ExactVectorIndex.load(str(tmp_path), "corpus-2") is None
@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from app.services.hybrid_retriever import BM25Index, reciprocal_rank_fusion
+
+
+def doc(text, source="resume.txt"):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_rrf_sums_scores_of_chunks_found_by_both_retrievers():
+    shared, vector_only, keyword_only = doc("shared"), doc("vector only"), doc("keyword only")
+    fused = reciprocal_rank_fusion([[vector_only, shared], [shared, keyword_only]], k=60)
+
+    assert [d.page_content for d, _ in fused] == ["shared", "vector only", "keyword only"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    assert fused[1][1] == 1 / 61
+    assert fused[2][1] == 1 / 62
+
+
+def test_rrf_tells_apart_equal_text_from_different_sources():
+    fused = reciprocal_rank_fusion([[doc("Skills", "a.txt")], [doc("Skills", "b.txt"), doc("Skills", "a.txt")]])
+
+    assert len(fused) == 2
+    assert fused[0][0].metadata["source"] == "a.txt"
+
+
+def test_rrf_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def keyword_index():
+    return BM25Index([
+        doc("Jason built services in Python and Kubernetes"),
+        doc("Jason ran Python jobs on AWS"),
+        doc("Jason led a team of five"),
+        doc("Jason enjoys hiking"),
+        doc("Jason speaks Spanish"),
+    ])
+
+
+def test_bare_rare_terms_are_keyword_queries():
+    index = keyword_index()
+
+    assert index.is_keyword_query("kubernetes", max_terms=2, max_doc_share=0.2)
+    assert index.is_keyword_query("Kubernetes AWS", max_terms=2, max_doc_share=0.2)
+
+
+def test_questions_are_not_keyword_queries():
+    index = keyword_index()
+
+    assert not index.is_keyword_query("Tell me about Jason", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("What Python experience does Jason have?", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("Does he know Kubernetes?", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("", max_terms=2, max_doc_share=0.2)
+
+
+def test_common_unknown_or_too_many_terms_are_not_keyword_queries():
+    index = keyword_index()
+
+    assert not index.is_keyword_query("jason", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("python", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("kubernetes rust", max_terms=2, max_doc_share=0.2)
+    assert not index.is_keyword_query("kubernetes aws hiking", max_terms=2, max_doc_share=0.2)
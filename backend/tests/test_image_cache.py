@@ -0,0 +1,71 @@
+import os
+import time
+
+from app.services.image_cache import ImageCache, prompt_key
+
+SVG = "image/svg+xml"
+
+
+def backdate(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_images_are_stored_by_content_and_found_by_prompt(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    image = cache.store("A  teal background", b"<svg>teal</svg>", SVG)
+
+    assert (tmp_path / image.name).read_bytes() == b"<svg>teal</svg>"
+    # A fresh instance, like another worker, reads the records from disk
+    reader = ImageCache(str(tmp_path))
+    assert reader.lookup("A teal background") == image
+    assert reader.get(image.name) == image
+    assert reader.lookup("A red background") is None
+    assert reader.get("../secrets.svg") is None
+    assert (reader.hits, reader.misses) == (1, 1)
+
+
+def test_least_recently_used_prompts_are_evicted_with_their_images(tmp_path):
+    cache = ImageCache(str(tmp_path), max_entries=2, touch_interval=0)
+    first = cache.store("first", b"<svg>1</svg>", SVG)
+    second = cache.store("second", b"<svg>2</svg>", SVG)
+    for path in tmp_path.glob("*.svg"):
+        backdate(path, 3600)
+    backdate(tmp_path / "prompts" / f"{prompt_key('first')}.json", 300)
+    backdate(tmp_path / "prompts" / f"{prompt_key('second')}.json", 200)
+    # Using "first" makes "second" the least recently used
+    assert cache.lookup("first") == first
+
+    cache.store("third", b"<svg>3</svg>", SVG)
+
+    assert sorted(os.listdir(tmp_path / "prompts")) == sorted(
+        f"{prompt_key(prompt)}.json" for prompt in ("first", "third")
+    )
+    assert not (tmp_path / second.name).exists()
+    assert ImageCache(str(tmp_path)).lookup("second") is None
+    assert cache.evictions == 1
+
+
+def test_images_shared_by_a_remaining_prompt_are_kept(tmp_path):
+    cache = ImageCache(str(tmp_path), max_entries=1)
+    shared = cache.store("first", b"<svg>same</svg>", SVG)
+    backdate(tmp_path / shared.name, 3600)
+    backdate(tmp_path / "prompts" / f"{prompt_key('first')}.json", 300)
+
+    cache.store("second", b"<svg>same</svg>", SVG)
+
+    assert os.listdir(tmp_path / "prompts") == [f"{prompt_key('second')}.json"]
+    assert (tmp_path / shared.name).exists()
+
+
+def test_generated_backgrounds_are_served_by_url(api_client):
+    response = api_client.post("/api/generate-background", json={"theme": "technical", "colors": ["amber"]})
+    assert response.status_code == 200
+    url = response.json()["image_url"]
+    assert api_client.post("/api/generate-background",
+                           json={"theme": "technical", "colors": ["amber"]}).headers["X-Cache"] == "HIT"
+
+    image = api_client.get(url)
+    assert image.status_code == 200 and image.headers["content-type"] == SVG
+    assert api_client.get(url, headers={"If-None-Match": image.headers["ETag"]}).status_code == 304
+    assert api_client.get("/api/backgrounds/" + "0" * 64 + ".svg").status_code == 404
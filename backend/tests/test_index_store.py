@@ -0,0 +1,104 @@
+import os
+import time
+
+from app.services.index_store import IndexVersions
+
+
+def age(versions, version, seconds):
+    then = time.time() - seconds
+    os.utime(versions.path(version), (then, then))
+
+
+def test_activate_switches_current(tmp_path):
+    versions = IndexVersions(str(tmp_path))
+    assert versions.current() is None
+
+    first = versions.create()
+    versions.activate(first)
+    second = versions.create(base=first)
+    versions.activate(second)
+
+    assert versions.current() == second
+    assert versions.list_versions() == sorted([first, second])
+
+
+def test_current_ignores_a_missing_version(tmp_path):
+    versions = IndexVersions(str(tmp_path))
+    versions.activate("gone")
+
+    assert versions.current() is None
+
+
+def test_create_copies_the_base_version(tmp_path):
+    versions = IndexVersions(str(tmp_path))
+    base = versions.create()
+    with open(os.path.join(versions.path(base), "index_manifest.json"), "w") as f:
+        f.write("{}")
+
+    copy = versions.create(base=base)
+
+    assert os.path.exists(os.path.join(versions.path(copy), "index_manifest.json"))
+
+
+def test_collect_garbage_removes_only_old_unkept_versions(tmp_path):
+    versions = IndexVersions(str(tmp_path))
+    old, recent, active = versions.create(), versions.create(), versions.create()
+    versions.activate(active)
+    age(versions, old, 600)
+    age(versions, active, 600)
+
+    removed = versions.collect_garbage(keep=[active], min_age_seconds=60)
+
+    assert removed == [old]
+    assert versions.list_versions() == sorted([recent, active])
+
+
+def test_activate_restarts_the_grace_period_of_the_retired_version(tmp_path):
+    versions = IndexVersions(str(tmp_path))
+    retired = versions.create()
+    versions.activate(retired)
+    age(versions, retired, 600)
+
+    versions.activate(versions.create())
+
+    assert versions.collect_garbage(keep=[versions.current()], min_age_seconds=60) == []
+    assert retired in versions.list_versions()
+
+
+def test_close_vectorstore_releases_the_chroma_system(tmp_path):
+    from chromadb.api.client import SharedSystemClient
+    from langchain_chroma import Chroma
+
+    from app.services.index_store import close_vectorstore
+    from app.services.mock_llm_service import HashingEmbeddings
+
+    systems = getattr(SharedSystemClient, "_identifier_to_system", None)
+    if systems is None:
+        systems = SharedSystemClient._identifer_to_system
+    chroma = Chroma(persist_directory=str(tmp_path / "v1"), embedding_function=HashingEmbeddings(dimensions=8))
+    chroma.add_texts(["Jason knows Python"])
+    identifier = chroma._client._identifier
+    assert identifier in systems
+
+    close_vectorstore(chroma)
+
+    assert identifier not in systems
+
+
+def test_reader_waits_for_the_builder_without_creating_the_index_dir(tmp_path, monkeypatch):
+    from app.services import llm_service as module
+
+    monkeypatch.setattr(module, "CHROMA_DIR", str(tmp_path / "chroma"))
+    reader, builder = module.LLMService(role="reader"), module.LLMService(role="builder")
+    try:
+        reader.warm_up()
+        assert not reader.ready and reader.status == "waiting_for_builder"
+        assert not (tmp_path / "chroma").exists()
+
+        builder.warm_up()
+        assert reader.refresh_index()
+        assert reader.ready and reader.status == "ready"
+        assert reader.corpus_version == builder.corpus_version
+    finally:
+        reader.close()
+        builder.close()
@@ -0,0 +1,98 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.services import prompt_builder
+from app.services.prompt_builder import HistoryCompactor, PromptBuilder, count_tokens, dedupe_chunks
+
+TEMPLATE = "Answer from the context.\n\n{context}"
+
+
+@pytest.fixture
+def no_encoding(monkeypatch):
+    """Count tokens with the offline estimate, so budgets don't depend on tiktoken"""
+    monkeypatch.setattr(prompt_builder, "_encoding", None)
+    monkeypatch.setattr(prompt_builder, "_encoding_loaded", True)
+
+
+def chunk(text, source="docs/resume.txt"):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_offline_estimate_is_four_characters_per_token(no_encoding):
+    assert count_tokens("") == 0
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
+
+
+def test_failed_encoding_load_is_logged_once(monkeypatch, caplog):
+    import tiktoken
+
+    def unavailable(model):
+        raise OSError("offline")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", unavailable)
+    monkeypatch.setattr(prompt_builder, "_encoding", None)
+    monkeypatch.setattr(prompt_builder, "_encoding_loaded", False)
+
+    assert prompt_builder.load_encoding() is None
+    assert count_tokens("abcdefgh") == 2
+    assert count_tokens("abcdefghijkl") == 3
+    assert len([r for r in caplog.records if "tiktoken encoding unavailable" in r.message]) == 1
+
+
+def test_dedupe_drops_repeated_chunks_and_splitter_overlap():
+    shared = "Jason deployed the platform with Docker and NGINX."
+    first = "Jason builds backend services in Python. " + shared
+    second = shared + " He also mentors the team."
+
+    parts = dedupe_chunks([chunk(first), chunk(second), chunk(first), chunk(shared, "docs/other.txt")])
+
+    assert parts == [
+        ("docs/resume.txt", first),
+        ("docs/resume.txt", "He also mentors the team."),
+        ("docs/other.txt", shared),
+    ]
+
+
+def test_prompt_keeps_recent_turns_and_summarizes_older_ones(no_encoding):
+    builder = PromptBuilder(max_prompt_tokens=220, summary_max_tokens=60)
+    messages = []
+    for number in range(8):
+        messages.append({"role": "user", "content": f"Question {number}. " + "detail " * 20})
+        messages.append({"role": "assistant", "content": f"Answer {number}. " + "detail " * 20})
+    messages.append({"role": "user", "content": "What about Python?"})
+
+    prompt = builder.build(TEMPLATE, [chunk("Jason builds services in Python.")], messages, conversation_id="c1")
+
+    assert prompt.messages[-1] == messages[-1]
+    assert prompt.messages[1]["role"] == "user"
+    assert 0 < prompt.summarized_turns < 16
+    assert "Summary of the earlier conversation" in prompt.messages[0]["content"]
+    assert "Jason builds services in Python." in prompt.messages[0]["content"]
+    assert prompt.prompt_tokens <= 220
+    assert prompt.tokens_saved > 0
+    assert builder.stats.to_dict()["requests"] == 1
+
+
+def test_context_stays_within_its_share_of_the_budget(no_encoding):
+    builder = PromptBuilder(max_prompt_tokens=200, context_share=0.5)
+    docs = [chunk(f"Chunk {number}: " + "skill " * 30) for number in range(6)]
+
+    prompt = builder.build(TEMPLATE, docs, [{"role": "user", "content": "Skills?"}])
+
+    assert 1 <= prompt.context_chunks < 6
+    assert "Chunk 0:" in prompt.messages[0]["content"]
+
+
+def test_summaries_are_extended_per_conversation_and_not_shared_without_an_id():
+    compactor = HistoryCompactor()
+    turns = [
+        {"role": "user", "content": "Does Jason know Python? Tell me more."},
+        {"role": "assistant", "content": "Yes. He has years of it."},
+    ]
+    first = compactor.summarize("c1", turns, max_tokens=100)
+    more = turns + [{"role": "user", "content": "And Docker?"}]
+
+    assert first == "User: Does Jason know Python?\nAssistant: Yes."
+    assert compactor.summarize("c1", more, max_tokens=100) == first + "\nUser: And Docker?"
+    assert compactor.summarize(None, more[2:], max_tokens=100) == "User: And Docker?"
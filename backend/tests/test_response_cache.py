@@ -0,0 +1,65 @@
+from app.services.response_cache import SemanticResponseCache
+
+SCOPE = ("conversation-a", "corpus-1")
+
+
+def test_semantic_hit_above_threshold_only():
+    cache = SemanticResponseCache(threshold=0.95)
+    cache.store("Does Jason know Python?", [1.0, 0.0, 0.0], "Yes.", SCOPE)
+
+    assert cache.lookup([0.99, 0.05, 0.0], SCOPE).answer == "Yes."
+    assert cache.lookup([0.0, 1.0, 0.0], SCOPE) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_do_not_leak_across_conversations_or_corpus_versions():
+    cache = SemanticResponseCache(threshold=0.95)
+    cache.store("Does Jason know Python?", [1.0, 0.0], "Yes.", SCOPE)
+
+    assert cache.lookup([1.0, 0.0], ("conversation-b", "corpus-1"), "Does Jason know Python?") is None
+    assert cache.lookup([1.0, 0.0], ("conversation-a", "corpus-2"), "Does Jason know Python?") is None
+    assert cache.lookup([1.0, 0.0], SCOPE).answer == "Yes."
+
+
+def test_purge_keeps_only_the_current_corpus_version():
+    cache = SemanticResponseCache()
+    cache.store("old", [1.0, 0.0], "old answer", ("c", "corpus-1"))
+    cache.store("new", [0.0, 1.0], "new answer", ("c", "corpus-2"))
+
+    cache.purge_corpus_versions("corpus-2")
+
+    assert cache.lookup([1.0, 0.0], ("c", "corpus-1")) is None
+    assert cache.lookup([0.0, 1.0], ("c", "corpus-2")).answer == "new answer"
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["scopes"] == 1
+
+
+def test_keyword_answers_are_found_by_text_without_a_vector():
+    cache = SemanticResponseCache()
+    cache.store("Python experience?", None, "Five years.", SCOPE)
+
+    assert cache.lookup(None, SCOPE, "python experience").answer == "Five years."
+    assert cache.lookup(None, ("other", "corpus-1"), "python experience") is None
+    assert cache.stats()["scopes"] == 0
+
+
+def test_storing_the_same_question_replaces_the_answer():
+    cache = SemanticResponseCache()
+    cache.store("Python?", [1.0, 0.0], "first", SCOPE)
+    cache.store("python", [1.0, 0.0], "second", SCOPE)
+
+    assert cache.lookup([1.0, 0.0], SCOPE).answer == "second"
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticResponseCache(max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], "A", SCOPE)
+    cache.store("b", [0.0, 1.0, 0.0], "B", SCOPE)
+    cache.lookup([1.0, 0.0, 0.0], SCOPE)
+    cache.store("c", [0.0, 0.0, 1.0], "C", SCOPE)
+
+    assert cache.lookup([0.0, 1.0, 0.0], SCOPE) is None
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE).answer == "A"
+    assert cache.lookup([0.0, 0.0, 1.0], SCOPE).answer == "C"
@@ -0,0 +1,108 @@
+import time
+
+from app.services.response_cache import conversation_key
+from app.services.session_store import SessionStore
+
+HISTORY = [
+    {"role": "system", "content": "Be brief."},
+    {"role": "user", "content": "Does Jason know Python?"},
+    {"role": "assistant", "content": "Yes."},
+]
+
+
+def test_history_key_matches_the_stateless_conversation_key():
+    store = SessionStore()
+    session = store.create(HISTORY)
+
+    assert session.history_key() == conversation_key(HISTORY + [{"role": "user", "content": "And Docker?"}])
+    session.append({"role": "user", "content": "And Docker?"}, {"role": "assistant", "content": "Also yes."})
+    assert session.history_key() == conversation_key(session.messages + [{"role": "user", "content": "Next"}])
+
+
+def test_old_turns_are_dropped_but_system_messages_kept():
+    store = SessionStore(max_messages=3)
+    session = store.create(HISTORY)
+
+    session.append({"role": "user", "content": "And Docker?"}, {"role": "assistant", "content": "Also yes."},
+                   max_messages=store.max_messages)
+
+    assert session.messages == [HISTORY[0]] + [
+        {"role": "user", "content": "And Docker?"}, {"role": "assistant", "content": "Also yes."}
+    ]
+    assert session.history_key() == conversation_key(session.messages + [{"role": "user", "content": "x"}])
+
+
+def test_least_recently_used_sessions_are_evicted_and_idle_ones_expire():
+    store = SessionStore(max_sessions=2, ttl_seconds=60)
+    first, second = store.create(), store.create()
+    store.get(first.id)
+    third = store.create()
+
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first and store.get(third.id) is third
+
+    first.updated_at = time.time() - 120
+    assert store.get(first.id) is None
+
+
+def test_sessions_in_a_directory_are_shared_between_stores(tmp_path):
+    writer = SessionStore(max_sessions=1, directory=str(tmp_path))
+    reader = SessionStore(directory=str(tmp_path))
+    session = writer.create(HISTORY)
+    assert reader.get(session.id).messages == HISTORY
+
+    session.append({"role": "user", "content": "And Docker?"}, {"role": "assistant", "content": "Also yes."})
+    writer.save(session)
+    # Evicted from memory, reloaded from the directory
+    writer.create()
+
+    assert len(reader.get(session.id).messages) == 5
+    assert len(writer.get(session.id).messages) == 5
+    assert reader.delete(session.id)
+    assert writer.get(session.id) is None
+
+
+def test_unknown_ids_are_rejected():
+    store = SessionStore()
+
+    assert store.get("../../etc/passwd") is None
+    assert store.get("0" * 32) is None
+
+
+class FailingLLM:
+    async def ainvoke(self, messages):
+        raise RuntimeError("upstream unavailable")
+
+
+def test_failed_turn_is_not_added_to_the_session(api_client, monkeypatch):
+    session_id = api_client.post("/api/sessions").json()["session_id"]
+    service = api_client.app.state.llm_service
+    working_llm = service.llm
+    monkeypatch.setattr(service, "llm", FailingLLM())
+
+    failed = api_client.post(f"/api/sessions/{session_id}/messages", json={"content": "Has Jason used React?"})
+
+    assert failed.status_code == 200
+    assert failed.json()["response"].startswith("I encountered an error")
+    assert api_client.get(f"/api/sessions/{session_id}").json()["messages"] == []
+
+    monkeypatch.setattr(service, "llm", working_llm)
+    answered = api_client.post(f"/api/sessions/{session_id}/messages", json={"content": "Has Jason used React?"})
+
+    assert "React" in answered.json()["response"]
+    assert [m["role"] for m in api_client.get(f"/api/sessions/{session_id}").json()["messages"]] == [
+        "user", "assistant"
+    ]
+
+
+def test_session_turns_build_one_conversation(api_client):
+    session_id = api_client.post("/api/sessions").json()["session_id"]
+
+    for question in ("Does Jason know Python?", "What about Docker?"):
+        response = api_client.post(f"/api/sessions/{session_id}/messages", json={"content": question})
+        assert response.status_code == 200
+
+    messages = api_client.get(f"/api/sessions/{session_id}").json()["messages"]
+    assert [m["content"] for m in messages if m["role"] == "user"] == ["Does Jason know Python?", "What about Docker?"]
+    assert api_client.delete(f"/api/sessions/{session_id}").status_code == 204
+    assert api_client.get(f"/api/sessions/{session_id}").status_code == 404
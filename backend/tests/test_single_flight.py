@@ -0,0 +1,158 @@
+import asyncio
+
+from app.services.single_flight import AsyncSingleFlight, AsyncStreamSingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return calls, results, flight.coalesced
+
+    calls, results, coalesced = asyncio.run(scenario())
+    assert calls == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert [leader for _, leader in results].count(True) == 1
+    assert coalesced == 4
+
+
+def test_leader_error_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        attempts = 0
+
+        async def failing():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        outcomes = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+
+        async def working():
+            return "recovered"
+
+        retry = await flight.do("key", working)
+        return attempts, outcomes, retry
+
+    attempts, outcomes, retry = asyncio.run(scenario())
+    assert attempts == 1
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert retry == ("recovered", True)
+
+
+def test_work_is_cancelled_only_when_every_waiter_leaves():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = not cancelled.is_set()
+
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return still_running, await asyncio.gather(first, second, return_exceptions=True)
+
+    still_running, outcomes = asyncio.run(scenario())
+    assert still_running
+    assert all(isinstance(outcome, asyncio.CancelledError) for outcome in outcomes)
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+def test_late_stream_subscriber_gets_the_full_replay():
+    async def scenario():
+        flight = AsyncStreamSingleFlight()
+        produced = asyncio.Event()
+        release = asyncio.Event()
+        streams_started = 0
+
+        async def tokens():
+            nonlocal streams_started
+            streams_started += 1
+            yield "a"
+            yield "b"
+            produced.set()
+            await release.wait()
+            yield "c"
+
+        first = asyncio.ensure_future(_collect(flight.subscribe("key", tokens)))
+        await produced.wait()
+        assert not flight.is_leader("key")
+        late = asyncio.ensure_future(_collect(flight.subscribe("key", tokens)))
+        await asyncio.sleep(0.01)
+        release.set()
+        return streams_started, await first, await late, flight.coalesced, flight.is_leader("key")
+
+    streams_started, first, late, coalesced, idle = asyncio.run(scenario())
+    assert streams_started == 1
+    assert first == late == ["a", "b", "c"]
+    assert coalesced == 1
+    assert idle
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def scenario():
+        flight = AsyncStreamSingleFlight()
+
+        async def tokens():
+            yield "a"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("stream broke")
+
+        return await asyncio.gather(
+            _collect(flight.subscribe("key", tokens)),
+            _collect(flight.subscribe("key", tokens)),
+            return_exceptions=True
+        )
+
+    outcomes = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+def test_stream_producer_is_cancelled_when_the_last_subscriber_leaves():
+    async def scenario():
+        flight = AsyncStreamSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def tokens():
+            try:
+                yield "a"
+                await asyncio.sleep(10)
+                yield "b"
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        stream = flight.subscribe("key", tokens)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight.is_leader("key")
+
+    assert asyncio.run(scenario())
+
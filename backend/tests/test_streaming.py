@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from app.services.streaming import sse_token_stream
+
+
+async def connected():
+    return False
+
+
+async def disconnected():
+    return True
+
+
+async def tokens(*values, delay=0.0, fail=None):
+    for value in values:
+        await asyncio.sleep(delay)
+        yield value
+    if fail:
+        raise RuntimeError(fail)
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+def parse(frame):
+    lines = frame.strip().split("\n")
+    event = lines[0][len("event: "):] if lines[0].startswith("event: ") else None
+    return event, json.loads(lines[-1][len("data: "):])
+
+
+def test_tokens_are_sent_as_frames_then_done():
+    frames = asyncio.run(collect(sse_token_stream(tokens("Jason ", "knows ", "Python"), connected)))
+
+    assert [parse(frame) for frame in frames[:3]] == [
+        (None, {"token": "Jason "}), (None, {"token": "knows "}), (None, {"token": "Python"})
+    ]
+    event, stats = parse(frames[3])
+    assert event == "done" and stats["tokens"] == 3 and stats["ttft_ms"] is not None
+    assert len(frames) == 4
+
+
+def test_heartbeats_are_sent_while_waiting_for_a_token():
+    frames = asyncio.run(collect(sse_token_stream(tokens("slow", delay=0.2), connected, heartbeat_interval=0.05)))
+
+    assert frames[0] == ": heartbeat\n\n"
+    assert parse(frames[-2]) == (None, {"token": "slow"})
+    assert parse(frames[-1])[0] == "done"
+
+
+def test_generation_errors_end_the_stream_with_an_error_event():
+    frames = asyncio.run(collect(sse_token_stream(tokens("partial", fail="model unavailable"), connected)))
+
+    assert [parse(frame) for frame in frames] == [
+        (None, {"token": "partial"}), ("error", {"error": "model unavailable"})
+    ]
+
+
+def test_generation_is_cancelled_when_the_client_disconnects():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(1)
+                yield "never"
+        finally:
+            closed.set()
+
+    async def scenario():
+        frames = await collect(sse_token_stream(endless(), disconnected, heartbeat_interval=0.01))
+        assert frames == []
+        await asyncio.wait_for(closed.wait(), timeout=1)
+
+    asyncio.run(scenario())
@@ -32,7 +32,8 @@ export default function AiBackground({
       setError(null)
       
       try {
-        const response = await fetch('http://localhost:8000/api/generate-background', {
+        const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000'
+        const response = await fetch(`${backendUrl}/api/generate-background`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -50,7 +51,8 @@ export default function AiBackground({
         }
         
         const data = await response.json()
-        setBackgroundImage(data.image_data)
+        // image_url points at cacheable image bytes; image_data is the inline fallback
+        setBackgroundImage(data.image_url ? new URL(data.image_url, backendUrl).href : data.image_data)
       } catch (err) {
         console.error('Error fetching background:', err)
         setError('Failed to load AI-generated background')
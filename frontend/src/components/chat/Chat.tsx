@@ -30,10 +30,13 @@ export default function Chat({ useMock = false, initialQuery = '', onQueryProces
   const [useMockMode, setUseMockMode] = useState(useMock)
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const inputRef = useRef<HTMLInputElement>(null)
+  // Server-side session holding the conversation, so each turn sends only the new message
+  const sessionIdRef = useRef<string | null>(null)
 
   // Reset state when initialQuery changes to empty string (modal closed)
   useEffect(() => {
     if (initialQuery === '') {
+      sessionIdRef.current = null
       setMessages([{
         role: 'assistant',
         content: 'Hi there! I can tell you about Jason\'s professional experience, skills, and projects. What would you like to know about? You can ask about specific technologies like "Python" or "React", or projects like "Project Sentinel" or "AIQA".',
@@ -97,6 +100,22 @@ export default function Chat({ useMock = false, initialQuery = '', onQueryProces
     }
   }, [initialQuery])
 
+  const createSession = async (backendUrl: string, history: Message[]) => {
+    const response = await fetch(`${backendUrl}/api/sessions`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ messages: history }),
+    })
+    if (!response.ok) {
+      throw new Error('Failed to create chat session')
+    }
+    const data = await response.json()
+    sessionIdRef.current = data.session_id
+    return data.session_id as string
+  }
+
   const sendMessage = async () => {
     if (input.trim() === '') return
 
@@ -111,16 +130,24 @@ export default function Chat({ useMock = false, initialQuery = '', onQueryProces
     setIsLoading(true)
 
     try {
-      // Send message to API with mock parameter if enabled
-      const response = await fetch(`http://localhost:8000/api/chat${useMockMode ? '?mock=true' : ''}`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          messages: [...messages, userMessage],
-        }),
-      })
+      const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000'
+      // Send only the new message to the session, with mock parameter if enabled
+      const postMessage = (sessionId: string) =>
+        fetch(`${backendUrl}/api/sessions/${sessionId}/messages${useMockMode ? '?mock=true' : ''}`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            content: userMessage.content,
+          }),
+        })
+
+      let response = await postMessage(sessionIdRef.current ?? await createSession(backendUrl, messages))
+      if (response.status === 404) {
+        // The session expired; start a new one from the conversation on screen
+        response = await postMessage(await createSession(backendUrl, messages))
+      }
 
       if (!response.ok) {
         throw new Error('Failed to get response')